@@ -2,13 +2,22 @@ from .salabim_plus import *
 from .misc_tools import *
 from .output_viewer import *
 
-__all__ = ['Entity',
+__all__ = ['DispatchPolicy',
+           'Entity',
            'EntityGenerator',
            'EntityTracker',
            'Environment',
+           'EventLog',
            'Kanban',
            'Machine',
            'MachineGroup',
+           'ParameterSweep',
+           'ReplicationRunner',
+           'RoutingTemplate',
+           'SamplingService',
+           'ShiftCalendar',
            'ShiftController',
            'Storage',
+           'StreamingStats',
+           'WarmupDetector',
            'Worker']
@@ -26,19 +26,32 @@ def make_shifts(shift_duration, off_days=[]):
         
     return shifts
 
-def make_steps(first_step, tasks):
+def make_steps(first_step, tasks, rng=None):
     """
     """
     
+    return list(iter_steps(first_step=first_step, tasks=tasks, rng=rng))
+
+def iter_steps(first_step, tasks, rng=None):
+    """
+    lazy version of make_steps, the branch of a step and the next step are 
+    only resolved once the entity has completed the current step, rng 
+    (called as rng(task name)) gives the random generator of the yield 
+    decisions of a task, e.g. `env['gener.part_a'].entity_rng(count)`, default 
+    `random`
+    """
+    
     step = first_step 
     fail_count = 0
-    steps = []
     while True:
         # details = copy.deepcopy(tasks[step])
         details = tasks[step]
 
+        yield details
+
         if 'yield' in details.keys():
-            if random.random() < details['yield']:
+            draw = rng(step) if rng is not None else random
+            if draw.random() < details['yield']:
                 details['result'] = 'pass'
                 details['route_to'] = details['route_to_pass']
             else:
@@ -50,15 +63,11 @@ def make_steps(first_step, tasks):
                 details['route_to'] = details['route_to_pass']
             else:
                 details['route_to'] = details['route_to_fail']
-
-        steps.append(details)
         
         if isinstance(details['route_to'], str):
             step = copy.deepcopy(details['route_to'])
         else:
             break
-        
-    return steps
 
 def make_assembly_step(env, run_time, route_to, manned=True, transit_time=1):
     """
@@ -1,8 +1,24 @@
 import pandas as pd 
 import datetime
+import glob
+import hashlib
+import os
+import tempfile
+import numpy as np
 import plotly.figure_factory as ff
 import plotly.express as px
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from .salabim_plus import EventLog
+
+# version of the trace parsing, part of the state cache key, bump it when 
+# get_state_df changes what it returns
+STATE_PARSER_VERSION = 1
+
 def get_trace_df(filepath):
     """
     reads in the output trace text file from a salabim_plus simulation
@@ -35,22 +51,112 @@ def get_trace_df(filepath):
 
     return df
 
-def get_state_df(filepath):
+def get_state_df(filepath, cache=False):
     """
     reads in the output trace text file from a salabim_plus simulation, 
     retains only data pertinent to state changes
 
     Args:
         filepath (str): filepath mapping to the output trace text file
+        cache (bool): option to read the state changes from (and save them 
+                      to) a columnar cache next to the trace (see 
+                      `read_state_cache`), only for traces in a directory 
+                      you trust since the cache may be a pickle, defaulted 
+                      to False
 
     Returns: 
         pd.DataFrame(): dataframe of state changes within simulation
     """
 
+    if cache:
+        df = read_state_cache(filepath)
+        if df is not None:
+            return df
+
     tmp = get_trace_df(filepath)
+    df = _filter_state_rows(tmp)
+
+    if cache:
+        write_state_cache(filepath, df)
+
+    return df
+
+def _state_cache_path(filepath):
+    """
+    returns the filepath of the state cache of a trace, named after the 
+    trace file size, mtime and the parser version so a changed trace or 
+    parser never matches an old cache
+    """
+
+    stat = os.stat(filepath)
+    key = f'{stat.st_size}:{stat.st_mtime_ns}:{STATE_PARSER_VERSION}'
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    extension = 'parquet' if pyarrow is not None else 'pkl'
+    return f'{filepath}.state-{digest}.{extension}'
+
+def read_state_cache(filepath):
+    """
+    reads the cached state changes of a trace, Parquet when pyarrow is 
+    installed, else a pickle
+
+    Args:
+        filepath (str): filepath mapping to the output trace text file
+
+    Returns:
+        pd.DataFrame(): dataframe of state changes, None if there is no 
+                        valid cache
+    """
+
+    path = _state_cache_path(filepath)
+    if not os.path.exists(path):
+        return None
+    # an unreadable cache (e.g. truncated or of another pandas version) is a 
+    # miss, the trace is parsed again
+    try:
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+    except Exception:
+        return None
+
+def write_state_cache(filepath, state_df):
+    """
+    caches the state changes of a trace next to it, stale caches of the 
+    trace are removed, the cache is written to a temporary file and moved in 
+    place so it is never seen half written, nothing is cached if writing 
+    fails
+
+    Args:
+        filepath (str): filepath mapping to the output trace text file
+        state_df (pd.DataFrame): dataframe of state changes of the trace
+    """
+
+    path = _state_cache_path(filepath)
+    tmp_path = None
+    try:
+        for stale in glob.glob(glob.escape(filepath) + '.state-*'):
+            if stale != path:
+                os.remove(stale)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', 
+                                        prefix='.state-', suffix='.tmp')
+        os.close(fd)
+        if path.endswith('.parquet'):
+            state_df.to_parquet(tmp_path)
+        else:
+            state_df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _filter_state_rows(trace_df):
+    """
+    retains only the state change rows of a (forward filled) trace dataframe 
+    and extracts the state change info as separate columns
+    """
 
     df = (
-        tmp
+        trace_df
         .drop('line#', axis=1)
         .fillna('')
         # filter to state change rows
@@ -71,6 +177,119 @@ def get_state_df(filepath):
 
     return df
 
+def iter_state_df(filepath, chunksize=100000):
+    """
+    reads the output trace text file from a salabim_plus simulation in 
+    chunks, retaining only the state change rows of each chunk, so memory is 
+    bounded by the chunk size instead of the trace size
+
+    Args:
+        filepath (str): filepath mapping to the output trace text file
+        chunksize (int): number of trace lines read per chunk, optional, 
+                         default=100000
+
+    Yields:
+        pd.DataFrame(): dataframe of the state changes of a chunk, same 
+                        columns as `get_state_df`
+    """
+
+    reader = pd.read_fwf(filepath, 
+                         widths=[6,11,21,36,50], 
+                         header=0, 
+                         skiprows=range(1,5), 
+                         chunksize=chunksize)
+
+    columns = ['time','current component']
+    carry = {} # last time and component of the previous chunk
+    with reader:
+        for chunk in reader:
+            # forward fill within the chunk, continuing from the last chunk
+            chunk.loc[:,columns] = chunk.loc[:,columns].ffill().fillna(carry)
+            last = chunk[columns].iloc[-1]
+            carry = last[last.notna()].to_dict()
+
+            yield _filter_state_rows(chunk)
+
+def get_state_df_chunked(filepath, chunksize=100000, cache=False):
+    """
+    streaming version of `get_state_df`, only the state change rows are 
+    kept in memory next to one chunk of the trace
+
+    Args:
+        filepath (str): filepath mapping to the output trace text file
+        chunksize (int): number of trace lines read per chunk, optional, 
+                         default=100000
+        cache (bool): option to read the state changes from (and save them 
+                      to) the same cache as `get_state_df`, defaulted to 
+                      False
+
+    Returns: 
+        pd.DataFrame(): dataframe of state changes within simulation
+    """
+
+    if cache:
+        df = read_state_cache(filepath)
+        if df is not None:
+            return df
+
+    df = pd.concat(list(iter_state_df(filepath, chunksize)))
+
+    if cache:
+        write_state_cache(filepath, df)
+
+    return df
+
+def get_event_log_df(filepath):
+    """
+    reads in the structured event log from a salabim_plus simulation (see 
+    `EventLog`)
+
+    Args:
+        filepath (str): filepath mapping to the event log file
+
+    Returns:
+        pd.DataFrame(): dataframe of events with time, component, kind, name 
+                        and value columns, string columns are categoricals
+    """
+
+    records, symbols = EventLog.read(filepath)
+    categories = pd.Index(symbols)
+
+    df = pd.DataFrame({'time': records['time']})
+    for column in ['component','kind','name','value']:
+        df[column] = pd.Categorical.from_codes(records[column], 
+                                               categories=categories)
+
+    return df
+
+def get_event_state_df(filepath):
+    """
+    reads in the structured event log from a salabim_plus simulation, 
+    retains only data pertinent to state changes, same columns as used from 
+    `get_state_df` by the get_*_state_df functions
+
+    Args:
+        filepath (str): filepath mapping to the event log file
+
+    Returns: 
+        pd.DataFrame(): dataframe of state changes within simulation
+    """
+
+    records, symbols = EventLog.read(filepath)
+    kinds = [i for i, symbol in enumerate(symbols) 
+             if symbol in ('set','create')]
+    records = records[
+        np.isin(records['kind'], kinds) & (records['value'] != 0)
+    ]
+
+    df = pd.DataFrame({
+        'time': records['time'],
+        'action_component': symbols[records['name']],
+        'value': symbols[records['value']],
+    })
+
+    return df
+
 def get_machine_state_df(state_df, start_time, duration, machine_list):
     """
     filters out a state change dataframe to only have machine relevant status 
@@ -1,7 +1,29 @@
 import salabim as sim
 # import pprint
+import abc
 import copy
-from collections import OrderedDict
+import concurrent.futures
+import fnmatch
+import functools
+import hashlib
+import heapq
+import inspect
+import itertools
+import json
+import math
+import os
+import pickle
+import random
+import statistics
+import sys
+import sysconfig
+import tempfile
+import zlib
+from collections import OrderedDict, deque
+
+import numpy as np
+
+_salabim_file = inspect.getfile(sim.Environment)
 
 class Error(Exception):
     """Base class for exceptions in this module."""
@@ -24,7 +46,15 @@ class Environment(sim.Environment):
     Extend `sim.Environment`
     """
 
-    def setup(self, suppress_trace_linenumbers=True):
+    event_log = None # EventLog fed by the state and queue changes
+    _trace_classes = None # trace filter, None traces everything
+    _trace_cache_size = 4096 # most trace filter decisions kept
+    _default_replication_seed = None # set while a replication is built
+
+    def setup(self, suppress_trace_linenumbers=True, index_entities=True,
+              entity_index_size=None, event_log=None, 
+              event_log_chunk_size=65536, trace_filter=None, 
+              replication_seed=None):
         """
         sim.Environment setup method for custom functionality
 
@@ -33,20 +63,865 @@ class Environment(sim.Environment):
                                                the reference code line number 
                                                within the trace output, 
                                                defaulted to True
+            index_entities (bool): option to keep an index of the entities
+                                   currently in the system, defaulted to True
+            entity_index_size (int): maximum number of entities kept in the
+                                     entity index, oldest entries are evicted
+                                     first, optional, default=None (unbounded)
+            event_log (str|file): filepath (or binary file object) to write a 
+                                  structured binary event log of the state 
+                                  and queue changes to (see `EventLog`), 
+                                  independent of the text trace, optional, 
+                                  default=None
+            event_log_chunk_size (int): number of events buffered in memory 
+                                        before a chunk is written to the 
+                                        event log, defaulted to 65536
+            trace_filter ([type|str,...]): only trace the events of these 
+                                           objects (see `set_trace_filter`), 
+                                           optional, default=None (trace 
+                                           everything)
+            replication_seed (int): seed the named random streams (see 
+                                    `random_stream`) and the generators' 
+                                    sampling services are derived from, 
+                                    runs with the same replication_seed see 
+                                    the same random inputs, optional, 
+                                    default=None (the seed of the 
+                                    replication being built by a 
+                                    `ReplicationRunner`, else drawn from 
+                                    `random` on first use)
         """
 
-        self._env_objs = {}
+        self._env_objs = {} # static model objects (machines, workers, ...)
+        self._entity_objs = OrderedDict() if index_entities else None # entities in the system
+        self._entity_index_size = entity_index_size
         self._suppress_trace_linenumbers = suppress_trace_linenumbers
 
+        # the event log is fed by the states and entities themselves, the 
+        # trace is left as asked for
+        if event_log is not None:
+            self.event_log = EventLog(event_log, event_log_chunk_size)
+        else:
+            self.event_log = None
+
+        self.set_trace_filter(trace_filter)
+
+        if replication_seed is None:
+            replication_seed = Environment._default_replication_seed
+        self.replication_seed = replication_seed
+        self._random_streams = {} # stream name to random.Random
+
+    def random_stream(self, name):
+        """
+        gets a named random stream, each stream is seeded from the 
+        replication seed and its name only, so it draws the same numbers in 
+        every run with that replication seed however other streams are used
+
+        Args:
+            name (str): name of the stream, e.g. 'part_a.op2.yield'
+
+        Returns:
+            random.Random: random generator of the stream
+        """
+
+        stream = self._random_streams.get(name)
+        if stream is None:
+            if self.replication_seed is None:
+                self.replication_seed = random.getrandbits(32)
+            stream = random.Random(f'{self.replication_seed}:{name}')
+            self._random_streams[name] = stream
+        return stream
+
+    def set_trace_filter(self, rules=None):
+        """
+        restricts the trace (text and event log) to the events of some 
+        objects, filtered events are dropped before they are written
+
+        Args:
+            rules ([type|str,...]): classes (e.g. Machine, Worker), the 
+                                    objects of which and their states and 
+                                    queues are traced, name suffixes (e.g. 
+                                    '_status') and glob patterns (e.g. 
+                                    'track.*_count'), None traces everything
+        """
+
+        if rules is None:
+            self._trace_classes = None
+            return
+
+        rules = list(rules)
+        self._trace_classes = tuple(rule for rule in rules 
+                                    if isinstance(rule, type))
+        strings = [rule for rule in rules if isinstance(rule, str)]
+        self._trace_patterns = [rule for rule in strings 
+                                if any(char in rule for char in '*?[')]
+        self._trace_suffixes = tuple(rule for rule in strings 
+                                     if rule not in self._trace_patterns)
+        self._trace_allowed = OrderedDict() # name to traced indicator, bounded
+        self._trace_owners = set() # names of objects of the traced classes
+        objs = list(self._env_objs.values())
+        if self._entity_objs is not None:
+            objs.extend(self._entity_objs.values())
+        for obj in objs:
+            self._add_trace_owner(obj)
+
+    def _add_trace_owner(self, obj):
+        """
+        adds an object to the owners the trace filter matches name prefixes 
+        against if it is of a traced class, the names derived from it (its 
+        states and queues) are only traced after it is added, so only its 
+        own names can have a stale decision
+
+        Args:
+            obj (sim.Component): salabim_plus top level object 
+        """
+
+        if isinstance(obj, self._trace_classes):
+            for name in (obj._name, getattr(obj, 'var_name', obj._name)):
+                self._trace_owners.add(name)
+                self._trace_allowed.pop(name, None)
+
+    def _is_traced(self, name):
+        """
+        checks whether the events of an object name pass the trace filter, 
+        the object or the object owning it (by name prefix) needs to match 
+        a rule
+        """
+
+        allowed = self._trace_allowed.get(name)
+        if allowed is not None:
+            return allowed
+
+        allowed = (
+            name.endswith(self._trace_suffixes)
+            or any(fnmatch.fnmatchcase(name, pattern) 
+                   for pattern in self._trace_patterns)
+        )
+        if not allowed and self._trace_owners:
+            idx = len(name)
+            while idx > 0 and not allowed:
+                allowed = name[:idx] in self._trace_owners
+                idx = name.rfind('_', 0, idx)
+
+        # entity names keep coming, so only the most recent decisions are kept
+        if len(self._trace_allowed) >= self._trace_cache_size:
+            self._trace_allowed.popitem(last=False)
+        self._trace_allowed[name] = allowed
+        return allowed
+
+    def print_trace(self, s1='', s2='', s3='', s4='', s0=None, 
+                    _optional=False):
+        """
+        extend `sim.Environment.print_trace()`, applies the trace filter and 
+        takes the line number from the caller outside salabim
+        """
+
+        # the filter is only set up once setup has run, the current 
+        # component exists by then
+        if self._trace_classes is not None and self.trace() and s3:
+            current = self.current_component()
+            name = s3.partition(' ')[0]
+            if name == 'current':
+                name = current.name()
+            if not self._is_traced(name):
+                return
+            # kept lines carry their own time and component, the lines that 
+            # would be forward filled from may have been filtered
+            if not s1:
+                s1 = self.time_to_str(self.now())
+            if not s2:
+                s2 = current.name()
+
+        if s0 is None and self.trace() and not self._suppress_trace_linenumbers:
+            # line number of the caller outside salabim, not of this method
+            frame = inspect.currentframe().f_back
+            while inspect.getfile(frame) == _salabim_file:
+                frame = frame.f_back
+            s0 = self.filename_lineno_to_str(inspect.getfile(frame), 
+                                             frame.f_lineno)
+        sim.Environment.print_trace(self, s1, s2, s3, s4, s0, _optional)
+
+    def log_event(self, kind, name, value=''):
+        """
+        records an event in the event log, events of objects dropped by the 
+        trace filter are not recorded
+
+        Args:
+            kind (str): kind of event, e.g. 'set' or 'enter'
+            name (str): name of the object the event is on
+            value: value of the event, e.g. the state value or the queue name
+        """
+
+        if self._trace_classes is not None and not self._is_traced(name):
+            return
+        self.event_log.record(
+            self.now(), self.current_component().name(), kind, name, str(value)
+        )
+
+    def utilization_table(self):
+        """
+        returns the utilization of every machine and worker in the 
+        environment, taken from their state accumulators
+
+        Returns:
+            {str: {str: float}}: object name to its `utilization()`
+        """
+
+        return {name: obj.utilization() 
+                for name, obj in self._env_objs.items() 
+                if isinstance(obj, (Machine, Worker))}
+
+    def run(self, *args, **kwargs):
+        """
+        extend `sim.Environment.run()`, writes the buffered events to the 
+        event log once the run returns
+        """
+
+        sim.Environment.run(self, *args, **kwargs)
+        if self.event_log is not None:
+            self.event_log.flush()
+
+    def close_event_log(self):
+        """
+        writes the buffered events and closes the event log
+        """
+
+        if self.event_log is not None:
+            self.event_log.close()
+
     def _add_env_objectlist(self, obj):
         """
-        add to the objectlist noting objects inside of the simulation
+        add to the objectlist noting objects inside of the simulation,
+        entities are kept in the entity index instead of the objectlist
 
         Args:
             obj (sim.Component): salabim_plus top level object 
         """
 
-        self._env_objs[obj._name] = obj
+        if isinstance(obj, Entity):
+            self._add_entity(obj)
+        else:
+            self._env_objs[obj._name] = obj
+
+        if self._trace_classes:
+            self._add_trace_owner(obj)
+
+    def _add_entity(self, entity):
+        """
+        add an entity to the entity index, evicting the oldest entries if the
+        index is bounded
+
+        Args:
+            entity (Entity): entity entering the simulation
+        """
+
+        if self._entity_objs is None:
+            return
+
+        self._entity_objs[entity._name] = entity
+        if self._entity_index_size is not None:
+            while len(self._entity_objs) > self._entity_index_size:
+                self._entity_objs.popitem(last=False)
+
+    def _remove_entity(self, entity):
+        """
+        remove an entity from the entity index once it has left the system
+
+        Args:
+            entity (Entity): entity leaving the simulation
+        """
+
+        if self._entity_objs is not None:
+            self._entity_objs.pop(entity._name, None)
+
+class EventLog(object):
+    """
+    Structured binary event log, state changes (create, set, trigger) and 
+    queue changes (enter, leave) are recorded where they happen as typed 
+    columns (time, component, kind, name, value) with the strings 
+    dictionary encoded, buffered in memory and written in chunks of NumPy 
+    record arrays
+    """
+
+    dtype = np.dtype([('time','f8'),('component','i4'),('kind','i4'),
+                      ('name','i4'),('value','i4')])
+
+    def __init__(self, file, chunk_size=65536):
+        """
+        setup EventLog specific attributes, opens the file to write to
+
+        Args:
+            file (str|file): filepath (or binary file object) to write to
+            chunk_size (int): number of events buffered in memory before a 
+                              chunk is written, defaulted to 65536
+        """
+
+        if hasattr(file, 'write'):
+            self.file = file
+            self._owns_file = False
+        else:
+            self.file = open(file, 'wb')
+            self._owns_file = True
+        self.chunk_size = chunk_size
+        self.symbols = {'': 0} # string to code mapping
+        self._new_symbols = [''] # symbols not written yet
+        self._rows = []
+
+    def _code(self, symbol):
+        """
+        returns the dictionary code of a string, adding it if new
+        """
+
+        code = self.symbols.get(symbol)
+        if code is None:
+            code = self.symbols[symbol] = len(self.symbols)
+            self._new_symbols.append(symbol)
+        return code
+
+    def record(self, time, component, kind, name, value):
+        """
+        records an event
+
+        Args:
+            time (float): time epoch of the event
+            component (str): name of the current component
+            kind (str): kind of event, e.g. 'set' or 'enter'
+            name (str): name of the object the event is on, e.g. 
+                        'machine_1_status'
+            value (str): value of the event, e.g. 'idle' or the queue entered
+        """
+
+        code = self._code
+        self._rows.append(
+            (time, code(component), code(kind), code(name), code(value))
+        )
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        writes the buffered events as a chunk, each chunk is the symbols 
+        added since the last chunk followed by the event records
+        """
+
+        if not self._rows:
+            return
+        np.save(self.file, np.array(self._new_symbols, dtype=str))
+        np.save(self.file, np.array(self._rows, dtype=self.dtype))
+        self._new_symbols = []
+        self._rows = []
+        self.file.flush()
+
+    def close(self):
+        """
+        writes the buffered events and closes the file if it was opened by 
+        the event log
+        """
+
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+    @staticmethod
+    def read(file):
+        """
+        reads an event log back
+
+        Args:
+            file (str|file): filepath (or binary file object) to read from
+
+        Returns:
+            (np.ndarray, np.ndarray): event records and the symbols their 
+                                      string columns index into
+        """
+
+        if not hasattr(file, 'read'):
+            with open(file, 'rb') as f:
+                return EventLog.read(f)
+
+        symbols = []
+        chunks = []
+        # the log ends at a clean end of file between chunks, a chunk cut 
+        # short or otherwise corrupt raises
+        while file.read(1):
+            file.seek(-1, os.SEEK_CUR)
+            symbols.extend(np.load(file).tolist())
+            chunks.append(np.load(file))
+
+        records = (np.concatenate(chunks) if chunks 
+                   else np.empty(0, dtype=EventLog.dtype))
+        return records, np.array(symbols, dtype=object)
+
+class RoutingTemplate(object):
+    """
+    A tasks dictionary compiled once into a compact routing graph, each 
+    entity then only draws its random times and branch outcomes
+    """
+
+    # step keys that may be given as a callable sampler instead of a value
+    time_keys = ('setup_time','run_time','teardown_time','transit_time')
+
+    def __init__(self, first_step, tasks):
+        """
+        setup RoutingTemplate specific attributes, compiles the tasks into 
+        nodes
+
+        Args:
+            first_step (str): name of the task an entity starts at
+            tasks (dict): nested dictionary mapping out the tasks an entity 
+                          can take, same formatting as used by 
+                          `misc_tools.make_steps`, except time values may be 
+                          callables (e.g. `sim.Normal(5, 0.5)` or a lambda) 
+                          that are sampled for each entity
+        """
+
+        index = {name: i for i, name in enumerate(tasks)}
+        if first_step not in index:
+            raise InputError(first_step, 'first_step', list(tasks))
+
+        self.first = index[first_step]
+        self.names = list(tasks) # task name of each node
+        self.nodes = [] # (static, samplers, kind, param, pass_to, fail_to)
+
+        for name, details in tasks.items():
+            static = {}
+            samplers = []
+            for key, value in details.items():
+                if key in self.time_keys and callable(value):
+                    samplers.append((key, value))
+                else:
+                    static[key] = value
+
+            if 'yield' in details:
+                kind, param = 'yield', details['yield']
+                pass_to = self._target(details['route_to_pass'], index)
+                fail_to = self._target(details['route_to_fail'], index)
+            elif 'fail_count' in details:
+                kind, param = 'fail_count', details['fail_count']
+                pass_to = self._target(details['route_to_pass'], index)
+                fail_to = self._target(details['route_to_fail'], index)
+            else:
+                kind, param = 'route', None
+                pass_to = fail_to = self._target(details['route_to'], index)
+
+            self.nodes.append(
+                (static, tuple(samplers), kind, param, pass_to, fail_to)
+            )
+
+    @staticmethod
+    def _target(route_to, index):
+        """
+        resolves a route_to value into a (route_to, node index) pair, the 
+        node index is None for a location that ends the routing
+
+        Args:
+            route_to (str|Kanban|Storage): task name or exit location
+            index ({str: int}): mapping of task name to node index
+        """
+
+        if isinstance(route_to, str):
+            if route_to not in index:
+                raise InputError(route_to, 'route_to', list(index))
+            return (route_to, index[route_to])
+        return (route_to, None)
+
+    def make_steps(self, rng=None):
+        """
+        draws the times and branch outcomes for one entity, times are drawn 
+        once per task so repeat visits reuse them
+
+        Args:
+            rng (function): returns the random generator of the yield 
+                            decisions of a task, called as rng(task name), 
+                            optional, default=None (`random`)
+
+        Returns:
+            [dict,...]: list of step dictionaries in the order they are taken
+        """
+
+        return list(self.iter_steps(rng))
+
+    def iter_steps(self, rng=None):
+        """
+        lazily draws the steps for one entity, the branch outcome of a step 
+        and the next step are only resolved once the current step completes, 
+        the times of a task are drawn on its first visit
+
+        Args:
+            rng (function): returns the random generator of the yield 
+                            decisions of a task, called as rng(task name), 
+                            optional, default=None (`random`)
+
+        Yields:
+            dict: step dictionary of the next step to take
+        """
+
+        drawn_times = {} # node index to the times drawn on its first visit
+        fail_count = 0
+        idx = self.first
+
+        while True:
+            static, samplers, kind, param, pass_to, fail_to = self.nodes[idx]
+
+            drawn = drawn_times.get(idx)
+            if drawn is None:
+                drawn = {key: sampler() for key, sampler in samplers}
+                drawn_times[idx] = drawn
+            details = static.copy()
+            details.update(drawn)
+
+            yield details
+
+            # decision tree to determine which branch the entity takes
+            if kind == 'yield':
+                draw = rng(self.names[idx]) if rng is not None else random
+                if draw.random() < param:
+                    details['result'] = 'pass'
+                    target = pass_to
+                else:
+                    details['result'] = 'fail'
+                    target = fail_to
+            elif kind == 'fail_count':
+                fail_count += 1
+                target = pass_to if fail_count == param else fail_to
+            else:
+                target = pass_to
+
+            details['route_to'] = target[0]
+
+            if target[1] is None:
+                break
+            idx = target[1]
+
+class SampleStream(object):
+    """
+    A seeded stream of one distribution, hands out variates one at a time 
+    from a buffer that is refilled in vectorised blocks when exhausted
+    """
+
+    __slots__ = ('draw', 'rng', 'block_size', 'buffer')
+
+    def __init__(self, draw, rng, block_size):
+        """
+        setup SampleStream specific attributes
+
+        Args:
+            draw (function): draws a block of variates, called as 
+                             draw(rng, size)
+            rng (np.random.Generator): random generator of the stream
+            block_size (int): number of variates drawn per refill
+        """
+
+        self.draw = draw
+        self.rng = rng
+        self.block_size = block_size
+        self.buffer = iter(()) # iterator over the preallocated variates
+
+    def __call__(self):
+        """
+        returns the next variate of the stream
+        """
+
+        try:
+            return next(self.buffer)
+        except StopIteration:
+            self.buffer = iter(self.draw(self.rng, self.block_size).tolist())
+            return next(self.buffer)
+
+class DecisionStream(object):
+    """
+    A seeded stream of uniform variates indexed by entity instead of drawn in 
+    turn, the draws of an entity do not depend on the order the entities 
+    make their decisions in, blocks of rows (one per entity) are drawn 
+    vectorised and only the most recent blocks are kept
+    """
+
+    __slots__ = ('seed', 'block_size', 'width', 'blocks')
+
+    cache_size = 8 # most recent blocks kept
+
+    def __init__(self, seed, block_size=1024, width=4):
+        """
+        setup DecisionStream specific attributes
+
+        Args:
+            seed ([int,...]): seed of the stream
+            block_size (int): number of entities (rows) per block
+            width (int): number of draws per entity kept in a block, further 
+                         draws of an entity are seeded one by one
+        """
+
+        self.seed = seed
+        self.block_size = block_size
+        self.width = width
+        self.blocks = OrderedDict() # block index to its rows of variates
+
+    def random(self, count, draw):
+        """
+        returns a draw of an entity
+
+        Args:
+            count (int): index of the entity, e.g. its make_count
+            draw (int): index of the draw of the entity
+        """
+
+        if draw >= self.width:
+            return np.random.default_rng(self.seed + [count, draw]).random()
+
+        block_idx, row = divmod(count, self.block_size)
+        block = self.blocks.get(block_idx)
+        if block is None:
+            block = np.random.default_rng(self.seed + [block_idx]).random(
+                (self.block_size, self.width)
+            ).tolist()
+            # a block is drawn again if an entity it holds outlives it
+            if len(self.blocks) >= self.cache_size:
+                self.blocks.popitem(last=False)
+            self.blocks[block_idx] = block
+        return block[row][draw]
+
+class EntityDecisions(object):
+    """
+    The draws of one entity from a `DecisionStream`, hands them out in turn 
+    like `random.random`
+    """
+
+    __slots__ = ('stream', 'count', 'draws')
+
+    def __init__(self, stream, count):
+        """
+        setup EntityDecisions specific attributes
+
+        Args:
+            stream (DecisionStream): stream the draws are taken from
+            count (int): index of the entity in the stream
+        """
+
+        self.stream = stream
+        self.count = count
+        self.draws = 0 # number of draws taken
+
+    def random(self):
+        """
+        returns the next draw of the entity
+        """
+
+        self.draws += 1
+        return self.stream.random(self.count, self.draws - 1)
+
+class SamplingService(object):
+    """
+    Draws process times in vectorised NumPy blocks, one seeded stream per 
+    distribution and parameter set, method names mirror the `random` module
+    """
+
+    def __init__(self, seed, name='', block_size=1024):
+        """
+        setup SamplingService specific attributes
+
+        Args:
+            seed (int): seed all streams of the service are derived from
+            name (str): name mixed into the stream seeds so services with the 
+                        same seed draw different streams, optional, 
+                        default=''
+            block_size (int): number of variates drawn per buffer refill, 
+                              optional, default=1024
+        """
+
+        self.seed = seed
+        self.name = name
+        self.block_size = block_size
+        self.streams = {}
+
+    def stream(self, key, draw, name=None):
+        """
+        gets the stream of a distribution, creates it on first use
+
+        Args:
+            key (tuple): distribution name and parameters
+            draw (function): draws a block of variates, called as 
+                             draw(rng, size)
+            name (str): name of the stream, e.g. its task, so equal 
+                        distributions of different tasks draw from separate 
+                        streams, optional, default=None
+
+        Returns:
+            SampleStream: callable returning the next variate
+        """
+
+        if name is not None:
+            key = key + (name,)
+        stream = self.streams.get(key)
+        if stream is None:
+            rng = np.random.default_rng([
+                self.seed, 
+                zlib.crc32(self.name.encode()), 
+                zlib.crc32(repr(key).encode())
+            ])
+            stream = SampleStream(draw, rng, self.block_size)
+            self.streams[key] = stream
+        return stream
+
+    def gauss(self, mu, sigma, name=None):
+        """
+        stream of normally distributed variates, see `random.gauss`
+        """
+
+        return self.stream(
+            ('gauss', mu, sigma), 
+            lambda rng, size: rng.normal(mu, sigma, size), 
+            name
+        )
+
+    def uniform(self, a, b, name=None):
+        """
+        stream of uniformly distributed variates, see `random.uniform`
+        """
+
+        return self.stream(
+            ('uniform', a, b), 
+            lambda rng, size: rng.uniform(a, b, size), 
+            name
+        )
+
+    def triangular(self, low, high, mode, name=None):
+        """
+        stream of triangularly distributed variates, see `random.triangular`
+        """
+
+        return self.stream(
+            ('triangular', low, high, mode), 
+            lambda rng, size: rng.triangular(low, mode, high, size), 
+            name
+        )
+
+    def expovariate(self, lambd, name=None):
+        """
+        stream of exponentially distributed variates, see `random.expovariate`
+        """
+
+        return self.stream(
+            ('expovariate', lambd), 
+            lambda rng, size: rng.exponential(1/lambd, size), 
+            name
+        )
+
+class BomTracker(object):
+    """
+    Tracks whether every line of a build of materials is available, the 
+    inventory locations in the bom notify it on each change
+    """
+
+    def __init__(self, var_name, bom):
+        """
+        setup BomTracker specific attributes, registers with the bom 
+        locations
+
+        Args:
+            var_name (str): name of the entity the bom is for
+            bom (dict): nested dictionary mapping out build of materials 
+                        required to process an entity, must follow standard 
+                        bom dictionary formatting (see bom variable 
+                        documentation)
+        """
+
+        self.bom = bom
+        self.lines = [
+            (details['location'], details['qty']) for details in bom.values()
+        ]
+        self.required_qty = 1 # number of entities the available state is evaluated for
+        self.available = LoggedState(var_name+'_bom_available', value=False) # all bom lines can be pulled
+        for location, _ in self.lines:
+            location.bom_trackers.append(self)
+        self.update()
+
+    def is_available(self, qty=None):
+        """
+        checks whether every bom line is available for a quantity of entities
+
+        Args:
+            qty (int): number of entities to build, optional, default=None 
+                       (the required_qty)
+        """
+
+        if qty is None:
+            qty = self.required_qty
+        for location, line_qty in self.lines:
+            if location.available() < line_qty * qty:
+                return False
+        return True
+
+    def update(self):
+        """
+        updates the available state, called by the bom locations on change
+        """
+
+        available = self.is_available()
+        if available != self.available():
+            self.available.set(available)
+
+    def reserve(self, qty=1):
+        """
+        reserves the bom lines for a quantity of entities so no other 
+        consumer can take them, the reservation is consumed as the entities 
+        pull their materials
+
+        Args:
+            qty (int): number of entities to reserve materials for, optional, 
+                       default=1
+        """
+
+        for location, line_qty in self.lines:
+            location.reservations[self] = (
+                location.reservations.get(self, 0) + line_qty * qty
+            )
+            location.reserved += line_qty * qty
+        for location, _ in self.lines:
+            location.notify_bom()
+
+    def consume(self, location):
+        """
+        consumes one unit of the tracker's own reservation at a bom location 
+        as an entity of the tracker pulls it, other consumers' pulls leave 
+        the reservation alone
+
+        Args:
+            location (Kanban|Storage): bom location pulled from
+        """
+
+        held = location.reservations.get(self, 0)
+        if held > 0:
+            location.reservations[self] = held - 1
+            location.reserved -= 1
+
+    def unregister(self):
+        """
+        stops the bom locations notifying the tracker, once its bom has been 
+        replaced, reservations still held are consumed by the entities made 
+        with it
+        """
+
+        for location, _ in self.lines:
+            if self in location.bom_trackers:
+                location.bom_trackers.remove(self)
+
+    def max_qty(self):
+        """
+        returns an estimate of the largest number of entities the bom 
+        locations can hold the materials for at once, from the capacity 
+        estimates of the locations, unbounded locations (capacity None, e.g. 
+        Storage) do not limit it
+
+        Returns:
+            int: number of entities, None if no bom location is bounded
+        """
+
+        max_qty = None
+        for location, line_qty in self.lines:
+            capacity = location.capacity()
+            if capacity is not None:
+                qty = capacity // line_qty
+                max_qty = qty if max_qty is None else min(max_qty, qty)
+        return max_qty
 
 class EntityGenerator(sim.Component):
     """
@@ -58,7 +933,10 @@ class EntityGenerator(sim.Component):
     def __init__(self, var_name, steps_func, env, 
                  arrival_type=None, start_at=0, 
                  bom=None, main_exit=None, cut_queue=False, interval=None, 
-                 inv_level=None, *args, **kwargs):
+                 inv_level=None, lightweight=False, record_state=False, 
+                 template_func=None, lazy_routing=False, sampling_seed=None, 
+                 counter_only=False, wip_cap=None, release_when=None, 
+                 bulk_orders=False, *args, **kwargs):
         """
         extend `sim.Component.__init__()`, override name variable, 
         setup EntityGenerator specific attributes
@@ -91,6 +969,43 @@ class EntityGenerator(sim.Component):
             inv_level (int): inventory level at which work in process should 
                              be maintained (only for arrival_type=`inv_based`,
                              optional, default=None)
+            lightweight (bool): indicator denoting entities should be made 
+                                without per-entity sim.State objects (see 
+                                Entity), optional, default=False
+            record_state (bool): indicator denoting lightweight entities 
+                                 should record their state changes, 
+                                 optional, default=False
+            template_func (function): routing template building function, 
+                                      called once with the env objects on 
+                                      the first entity, must return a 
+                                      RoutingTemplate, replaces per-entity 
+                                      steps_func calls when given, optional, 
+                                      default=None
+            lazy_routing (bool): indicator denoting entities should resolve 
+                                 their steps from the routing template one 
+                                 at a time as each step completes (only for 
+                                 template_func, optional, default=False)
+            sampling_seed (int): seed of the generator's SamplingService, 
+                                 the environment replication_seed if not 
+                                 given, optional, default=None
+            counter_only (bool): indicator denoting the generator's tracker 
+                                 should not retain entities (see 
+                                 EntityTracker), optional, default=False
+            wip_cap (int): work in process limit for demand driven arrivals, 
+                           the generator sleeps until work in process falls 
+                           below it and then releases entities up to it in 
+                           bulk (only for arrival_type=`continuous`, 
+                           optional, default=None)
+            release_when (tuple): salabim wait condition, e.g. 
+                                  (machine.state, 'waiting_material'), the 
+                                  generator additionally sleeps on before 
+                                  each bulk release (only for 
+                                  arrival_type=`continuous` with a wip_cap, 
+                                  optional, default=None)
+            bulk_orders (bool): indicator denoting orders should be made in 
+                                one go, reserving the bom for the whole 
+                                order (only for arrival_type=`ordered`, 
+                                optional, default=False)
             *arg, **kwargs: sim.Component specific default attributes
         """
         
@@ -98,27 +1013,42 @@ class EntityGenerator(sim.Component):
         
         self.entity = Entity # Entity base class
         self.make_count = 0 
-        self.tracker = EntityTracker(var_name, env) # EntityTracker instance of var_name=var_name
+        self.tracker = EntityTracker(var_name, env, counter_only=counter_only) # EntityTracker instance of var_name=var_name
         self.var_name = self._name.replace('gener.','').replace('.','_')
         # self.steps = steps
         self.steps_func = steps_func
+        self.template_func = template_func
+        self.routing_template = None # RoutingTemplate compiled on first use
+        self.lazy_routing = lazy_routing
+        self.sampling_seed = sampling_seed
+        self._sampling = None # SamplingService created on first use
+        self._decision_streams = {} # task name to DecisionStream of its yield decisions
         self.bom = bom
+        self.bom_tracker = None # BomTracker built from bom on first check
         self.main_exit = main_exit
         self.cut_queue = cut_queue
         self.arrival_type = arrival_type
         self.start_at = start_at
+        self.lightweight = lightweight
+        self.record_state = record_state
+        self.bulk_orders = bulk_orders
         self.env = env
         env._add_env_objectlist(self)
         
         # decision tree to initialize arrival_type specific attributes
         if arrival_type == 'continuous':
-            pass
+            self.wip_cap = wip_cap
+            self.release_when = release_when
+            # release_when alone would release every time epoch it holds 
+            if release_when is not None and wip_cap is None:
+                raise ValueError('release_when needs a wip_cap, without one '
+                                 'the generator releases every time epoch')
         elif arrival_type == 'periodic':
             self.interval = interval
         elif arrival_type == 'ordered':  
             # sim.State used to know if any entities have been ordered
             self.ordered_qty = (
-                sim.State(self.var_name+'_ordered_qty', value=0)
+                LoggedState(self.var_name+'_ordered_qty', value=0)
             )
         elif arrival_type == 'inv_based':
             self.inv_level = inv_level
@@ -127,6 +1057,82 @@ class EntityGenerator(sim.Component):
             options = ['continuous','periodic','ordered','inv_based']
             raise InputError(arrival_type, 'arrival_type', options)
         
+    @property
+    def sampling(self):
+        """
+        SamplingService of the generator, routing functions can draw their 
+        process times from it, e.g. `env['gener.part_a'].sampling.gauss(5, 
+        0.5)` returns a callable usable as a RoutingTemplate time value
+        """
+
+        if self._sampling is None:
+            if self.sampling_seed is None:
+                if self.env.replication_seed is None:
+                    self.env.replication_seed = random.getrandbits(32)
+                self.sampling_seed = self.env.replication_seed
+            self._sampling = SamplingService(
+                seed=self.sampling_seed, name=self.var_name
+            )
+        return self._sampling
+
+    def rng(self, name):
+        """
+        gets a named random stream of the generator (see 
+        `Environment.random_stream`), e.g. `env['gener.part_a'].rng('op2')` 
+        for the draws of a routing step or a yield decision
+
+        Args:
+            name (str): name of the stream within the generator
+        """
+
+        return self.env.random_stream(self.var_name + '.' + name)
+
+    def entity_rng(self, count):
+        """
+        gets the random streams of the yield decisions of one entity, the 
+        decisions of a task are taken from a stream per task indexed by the 
+        entity's make_count, so they do not depend on the order the entities 
+        get through the tasks
+
+        Args:
+            count (int): make_count of the entity
+
+        Returns:
+            function: returns the random stream of a task, called as 
+                      rng(task name)
+        """
+
+        streams = {}
+        def rng(task):
+            stream = streams.get(task)
+            if stream is None:
+                stream = streams[task] = EntityDecisions(
+                    self.decision_stream(task), count
+                )
+            return stream
+        return rng
+
+    def decision_stream(self, task):
+        """
+        gets the stream of the yield decisions of a routing task, seeded from 
+        the replication seed, the generator and the task
+
+        Args:
+            task (str): name of the task
+        """
+
+        stream = self._decision_streams.get(task)
+        if stream is None:
+            if self.env.replication_seed is None:
+                self.env.replication_seed = random.getrandbits(32)
+            stream = DecisionStream([
+                self.env.replication_seed, 
+                zlib.crc32(self.var_name.encode()), 
+                zlib.crc32(task.encode())
+            ])
+            self._decision_streams[task] = stream
+        return stream
+
     def arrive(self):
         """
         main sim.Component process to start generating entities
@@ -149,15 +1155,33 @@ class EntityGenerator(sim.Component):
     
     def continuous_arrivals(self):
         """
-        continuously make entities
+        continuously make entities, demand driven when a wip_cap is given
         """
         
-        while True:
-            if self.bom:
-                yield from self.check_bom_inv()
-            self.make_entity()
-            yield self.hold(1) # delay 1 time epoch to prevent inf loop
+        if self.wip_cap is not None:
+            yield from self.demand_arrivals()
+        else:
+            while True:
+                if self.bom:
+                    yield from self.check_bom_inv()
+                self.make_entity()
+                yield self.hold(1) # delay 1 time epoch to prevent inf loop
             
+    def demand_arrivals(self):
+        """
+        make entities only when downstream capacity frees up, sleeps until 
+        work in process falls below wip_cap (and release_when holds), then 
+        releases entities up to wip_cap in bulk
+        """
+
+        while True:
+            yield self.wait(
+                (self.tracker.wip_count, lambda v, c, s: v < self.wip_cap)
+            )
+            if self.release_when is not None:
+                yield self.wait(self.release_when)
+            yield from self.release_inv(level=self.wip_cap)
+
     def periodic_arrivals(self):
         """
         make entities at a predefined rate
@@ -178,7 +1202,7 @@ class EntityGenerator(sim.Component):
             yield self.wait((self.ordered_qty, lambda v, c, s: v > 0))
 
             if self.bom:
-                yield from self.check_bom_inv()
+                yield from self.check_bom_inv(reserve=False)
             yield from self.fulfill_order()      
             
     def inv_based_arrivals(self):
@@ -191,49 +1215,122 @@ class EntityGenerator(sim.Component):
                 (self.tracker.wip_count, lambda v, c, s: v < self.inv_level)
             )
             if self.bom:
-                yield from self.check_bom_inv()
+                yield from self.check_bom_inv(reserve=False)
             yield from self.release_inv()
         
     def fulfill_order(self):
         """
-        makes entities of a specified order quantity
+        makes entities of a specified order quantity, all at once when 
+        bulk_orders is set
         """
         
-        for _ in range(self.ordered_qty()):
+        qty = self.ordered_qty()
+        if self.bulk_orders and self.bom:
+            # a reservation larger than the bom locations can hold would 
+            # wait forever, such orders are reserved one entity at a time
+            max_qty = self.get_bom_tracker().max_qty()
+            bulk = max_qty is None or qty <= max_qty
+        else:
+            bulk = self.bulk_orders
+
+        if bulk:
             if self.bom:
-                yield from self.check_bom_inv()
-            self.make_entity()
+                yield from self.check_bom_inv(qty=qty)
+            self.make_entities(qty)
+        else:
+            for _ in range(qty):
+                if self.bom:
+                    yield from self.check_bom_inv()
+                self.make_entity()
         self.ordered_qty.set(0)
             
-    def release_inv(self):
+    def release_inv(self, level=None):
         """
         makes entities needed to reach a specified inventory threshold
+
+        Args:
+            level (int): work in process level to reach, optional, 
+                         default=None (the generator's inv_level)
         """
         
-        for _ in range(self.inv_level - self.tracker.wip_count()):
+        if level is None:
+            level = self.inv_level
+        for _ in range(level - self.tracker.wip_count()):
             if self.bom:
                 # print(True)
                 yield from self.check_bom_inv()
             self.make_entity()
     
-    def make_entity(self):
+    def make_entity(self, steps=None, in_system=False):
         """
         makes an entity
+
+        Args:
+            steps ([dict,...]|iterator): steps of the entity, optional, 
+                                         default=None (drawn by get_steps)
+            in_system (bool): indicator denoting the entity has already been 
+                              entered into the tracker, optional, 
+                              default=False
         """
         
         self.make_count += 1
         # pprint.pprint(globals())
-        self.entity(var_name=self.var_name+'_'+str(self.make_count), env=self.env,
-                    steps=self.steps_func(env=self.env._env_objs), tracker=self.tracker, 
-                    bom=self.bom, main_exit=self.main_exit, cut_queue=self.cut_queue)
+        if steps is None:
+            steps = self.get_steps()
+        return self.entity(var_name=self.var_name+'_'+str(self.make_count), env=self.env,
+                           steps=steps, tracker=self.tracker, 
+                           bom=self.bom, main_exit=self.main_exit, cut_queue=self.cut_queue,
+                           lightweight=self.lightweight, record_state=self.record_state,
+                           in_system=in_system, 
+                           bom_tracker=self.bom_tracker if self.bom else None)
+
+    def make_entities(self, qty):
+        """
+        makes a quantity of entities at once, they enter the tracker with a 
+        single update instead of one per entity, the bom should already be 
+        reserved for the whole quantity
+
+        Args:
+            qty (int): number of entities to make
+
+        Returns:
+            [Entity,...]: the entities made
+        """
+
+        entities = [self.make_entity(in_system=True) for _ in range(qty)]
+        self.tracker.entities_entered(entities)
+        return entities
 
-    def populate_inv(self, location):
+    def get_steps(self):
         """
+        gets the steps of a new entity, from the compiled routing template 
+        when a template_func is given, else from steps_func
         """
 
-        self.make_count += 1
-        self.entity(var_name=self.var_name+'_'+str(self.make_count), env=self.env,
-                    steps=[{'route_to': location}], tracker=self.tracker, prepop=True)
+        if self.template_func is None:
+            return self.steps_func(env=self.env._env_objs)
+
+        if self.routing_template is None:
+            self.routing_template = self.template_func(env=self.env._env_objs)
+        rng = self.entity_rng(self.make_count)
+        if self.lazy_routing:
+            return self.routing_template.iter_steps(rng)
+        return self.routing_template.make_steps(rng)
+
+    def populate_inv(self, location, qty=1):
+        """
+        prepopulates an inventory location with tokens of the entity, no 
+        components are made until the tokens are pulled, the tokens are 
+        counted as made and completed like prepopulated entities
+
+        Args:
+            location (Kanban|Storage): inventory location to populate
+            qty (int): number of entities to populate, optional, default=1
+        """
+
+        self.make_count += qty
+        self.tracker.entities_passed(qty)
+        location.add_tokens(qty, record=self.var_name)
         
     def send_order(self, qty):
         """
@@ -246,20 +1343,211 @@ class EntityGenerator(sim.Component):
         
         self.ordered_qty.set(qty)
         
-    def check_bom_inv(self):
+    def get_bom_tracker(self):
+        """
+        gets the BomTracker of the generator's bom, rebuilt when the bom has 
+        been replaced
+
+        Returns:
+            BomTracker: tracker of the bom
+        """
+
+        if self.bom_tracker is None or self.bom_tracker.bom is not self.bom:
+            if self.bom_tracker is not None:
+                self.bom_tracker.unregister()
+            self.bom_tracker = BomTracker(self.var_name, self.bom)
+        return self.bom_tracker
+
+    def check_bom_inv(self, reserve=True, qty=1):
         """
         check build of material inventory to ensure adequate material is 
-        available, wait until all material is available if short
+        available, wait until all material is available if short, then 
+        reserve the material for the entities
+
+        Args:
+            reserve (bool): indicator denoting the material should be 
+                            reserved for entities about to be made, 
+                            optional, default=True
+            qty (int): number of entities the material is needed for, 
+                       optional, default=1
         """
         
-        bom_requirements = [
-            (details['location'].count, lambda v, c, s: v >= details['qty'])
-            for part, details in self.bom.items()
-        ]
-#         print(bom_requirements)
-#         for cond in bom_requirements:
-#             print(cond[0]())
-        yield self.wait(*bom_requirements, all=True)            
+        self.get_bom_tracker()
+        if self.bom_tracker.required_qty != qty:
+            self.bom_tracker.required_qty = qty
+            self.bom_tracker.update()
+
+        # re-check after waking, another consumer may have reserved first
+        while not self.bom_tracker.is_available():
+            yield self.wait((self.bom_tracker.available, True))
+        if reserve:
+            self.bom_tracker.reserve(qty)
+
+class P2Quantile(object):
+    """
+    Streaming estimate of a quantile in fixed memory, using the P-square 
+    algorithm of Jain and Chlamtac (five markers, no stored observations)
+    """
+
+    def __init__(self, p):
+        """
+        setup P2Quantile specific attributes
+
+        Args:
+            p (float): quantile to estimate, between 0 and 1
+        """
+
+        self.p = p
+        self.heights = [] # marker heights, the first 5 observations until full
+        self.positions = [1, 2, 3, 4, 5] # actual marker positions
+        self.desired = [1, 1+2*p, 1+4*p, 3+2*p, 5] # desired marker positions
+        self.increments = [0, p/2, p, (1+p)/2, 1] # desired position increments
+
+    def add(self, x):
+        """
+        adds an observation to the estimate
+
+        Args:
+            x (float): observed value
+        """
+
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        n = self.positions
+
+        # find the cell the observation falls in, extend the extremes
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k+1]:
+                k += 1
+
+        for i in range(k+1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # adjust the middle markers when they drift off their desired position
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i+1] - n[i] > 1) or (d <= -1 and n[i-1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i+1] - n[i-1]) * (
+                    (n[i] - n[i-1] + d) * (q[i+1] - q[i]) / (n[i+1] - n[i])
+                    + (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / (n[i] - n[i-1])
+                )
+                if not q[i-1] < height < q[i+1]:
+                    height = q[i] + d * (q[i+d] - q[i]) / (n[i+d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        """
+        returns the current quantile estimate, None without observations
+        """
+
+        q = self.heights
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[int(round(self.p * (len(q) - 1)))]
+        return q[2]
+
+class StreamingStats(object):
+    """
+    Fixed memory statistics of a stream of observations: count, mean and 
+    variance (Welford), min, max and P-square quantile estimates
+    """
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.95)):
+        """
+        setup StreamingStats specific attributes
+
+        Args:
+            quantiles ((float,...)): quantiles to estimate, optional, 
+                                     default=(0.5, 0.9, 0.95)
+        """
+
+        self.quantile_levels = quantiles
+        self.reset()
+
+    def reset(self):
+        """
+        discards all observations
+        """
+
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0 # sum of squared deviations from the mean
+        self.minimum = None
+        self.maximum = None
+        self.quantiles = {p: P2Quantile(p) for p in self.quantile_levels}
+
+    def add(self, x):
+        """
+        adds an observation
+
+        Args:
+            x (float): observed value
+        """
+
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+        if self.minimum is None or x < self.minimum:
+            self.minimum = x
+        if self.maximum is None or x > self.maximum:
+            self.maximum = x
+
+        for estimate in self.quantiles.values():
+            estimate.add(x)
+
+    def variance(self):
+        """
+        returns the sample variance, None with fewer than 2 observations
+        """
+
+        if self.count < 2:
+            return None
+        return self._m2 / (self.count - 1)
+
+    def quantile(self, p):
+        """
+        returns the estimate of quantile p (must be one of the quantiles 
+        given on setup)
+
+        Args:
+            p (float): quantile level
+        """
+
+        return self.quantiles[p].value()
+
+    def summary(self):
+        """
+        returns the statistics as a dictionary
+        """
+
+        summary = {
+            'count': self.count,
+            'mean': self.mean if self.count else None,
+            'variance': self.variance(),
+            'min': self.minimum,
+            'max': self.maximum
+        }
+        for p, estimate in self.quantiles.items():
+            summary['p'+str(int(round(p * 100)))] = estimate.value()
+        return summary
 
 class EntityTracker(sim.Component):
     """
@@ -267,35 +1555,462 @@ class EntityTracker(sim.Component):
     Tracks when entities of var_name enter and leave the sim.env system
     """
     
-    def __init__(self, var_name, env, *args, **kwargs):
+    def __init__(self, var_name, env, counter_only=False, *args, **kwargs):
+        """
+        extend `sim.Component.__init__()`, override name variable,
+        setup EntityTracker specific attributes
+        
+        Args:
+            var_name (str): name of the entity
+            env (EnvironmentPlus): salabim_plus simulation environment
+            counter_only (bool): indicator denoting the tracker should only 
+                                 keep counters and streaming flow time 
+                                 statistics instead of wip and complete 
+                                 queues holding the entities, optional, 
+                                 default=False
+            *arg, **kwargs: sim.Component specific default attributes
+        """
+        
+        sim.Component.__init__(self, name='track.'+var_name, *args, **kwargs)
+        self.env = env
+        env._add_env_objectlist(self)
+        
+        self.counter_only = counter_only
+        if counter_only:
+            self.wip = None
+            self.complete = None
+        else:
+            self.wip = sim.Queue(self._name+'_wip')
+            self.complete = sim.Queue(self._name+'_complete')
+        self.wip_num = 0 # number of entities in the system
+        self.complete_num = 0 # number of entities that have left the system
+        self.flow_time = StreamingStats() # time from entering to leaving the system
+        self.start_time = env.now() # time epoch the counters are kept from
+        self.wip_count = LoggedState(self._name+'_wip_count', value=0)
+        self.complete_count = LoggedState(self._name+'_complete_count', value=0)
+        self.series_interval = None # length of the intervals of the series
+        self.wip_series = [] # time average wip per interval
+        self.throughput_series = [] # completions per time epoch per interval
+
+    def start_series(self, interval):
+        """
+        starts keeping the wip and throughput series, one observation per 
+        interval of time
+
+        Args:
+            interval (float): length of the intervals
+        """
+
+        self.series_interval = interval
+        self.wip_series = []
+        self.throughput_series = []
+        self._series_last = self.env.now() # time epoch wip was last integrated to
+        self._series_end = self._series_last + interval # end of the open interval
+        self._series_area = 0. # wip integrated over the open interval
+        self._series_done = 0 # completions in the open interval
+
+    def record_series(self):
+        """
+        integrates the current wip up to now, closing the intervals that 
+        ended, called before the wip changes
+        """
+
+        if self.series_interval is None:
+            return
+
+        now = self.env.now()
+        while now >= self._series_end:
+            self._series_area += self.wip_num * (self._series_end - self._series_last)
+            self.wip_series.append(self._series_area / self.series_interval)
+            self.throughput_series.append(
+                self._series_done / self.series_interval
+            )
+            self._series_last = self._series_end
+            self._series_end += self.series_interval
+            self._series_area = 0.
+            self._series_done = 0
+        self._series_area += self.wip_num * (now - self._series_last)
+        self._series_last = now
+
+    def reset_stats(self):
+        """
+        discards the completions and flow times so far, the counters are 
+        kept from now on (the wip stays as it is), the complete queue is 
+        emptied so it agrees with the completion count
+        """
+
+        self.complete_num = 0
+        if self.complete is not None:
+            self.complete.clear()
+        self.flow_time.reset()
+        self.start_time = self.env.now()
+        self.update()
+
+    def entity_entered(self, entity):
+        """
+        updates the tracker when an entity enters the system
+
+        Args:
+            entity (Entity): entity entering the system
+        """
+
+        self.entities_entered([entity])
+
+    def entities_entered(self, entities):
+        """
+        updates the tracker when entities enter the system, the tracker 
+        states are updated once for all of them
+
+        Args:
+            entities ([Entity,...]): entities entering the system
+        """
+
+        self.record_series()
+        now = self.env.now()
+        for entity in entities:
+            entity.entered_at = now
+            if not self.counter_only:
+                entity.enter(self.wip)
+        self.wip_num += len(entities)
+        self.update()
+
+    def entities_passed(self, qty):
+        """
+        updates the tracker for entities that enter and complete at once 
+        without a component (e.g. prepopulated tokens), they count as 
+        completed with a flow time of 0 but are not in the complete queue
+
+        Args:
+            qty (int): number of entities
+        """
+
+        self.record_series()
+        if self.series_interval is not None:
+            self._series_done += qty
+        for _ in range(qty):
+            self.flow_time.add(0)
+        self.complete_num += qty
+        self.update()
+
+    def entity_left(self, entity):
+        """
+        updates the tracker when an entity leaves the system
+
+        Args:
+            entity (Entity): entity leaving the system
+        """
+
+        self.record_series()
+        if self.series_interval is not None:
+            self._series_done += 1
+        self.flow_time.add(self.env.now() - entity.entered_at)
+        self.wip_num -= 1
+        self.complete_num += 1
+        if not self.counter_only:
+            entity.leave(self.wip)
+            entity.enter(self.complete)
+        self.update()
+        
+    def update(self):
+        """
+        updates the tracker states so they are consistent with the tracker 
+        counters
+        """
+        
+        self.wip_count.set(self.wip_num)
+        self.complete_count.set(self.complete_num)
+
+    def throughput(self):
+        """
+        returns the number of entities completed per time epoch since the 
+        tracker started counting
+        """
+
+        elapsed = self.env.now() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return self.complete_num / elapsed
+
+    def summary(self):
+        """
+        returns the tracker counters and flow time statistics as a dictionary
+        """
+
+        return {
+            'wip': self.wip_num,
+            'complete': self.complete_num,
+            'throughput': self.throughput(),
+            'flow_time': self.flow_time.summary()
+        }
+    
+
+class WarmupDetector(sim.Component):
+    """
+    Extend `sim.Component`
+    Detects the warm-up period with MSER-5 on the wip and throughput series 
+    of the EntityTrackers and resets the statistics once it is found, MSER 
+    only accepts a truncation point in the first half of a series, so the 
+    reset (reset_time) comes at the earliest at twice the warm-up length 
+    into the series and the statistics cover the run from reset_time on, 
+    not from the end of the warm-up (warmup_time)
+    """
+
+    def __init__(self, env, interval, check_interval=None, batch_size=5, 
+                 min_batches=10, *args, **kwargs):
+        """
+        extend `sim.Component.__init__()`, setup WarmupDetector specific 
+        attributes, starts the series of every EntityTracker in the 
+        environment
+
+        Args:
+            env (EnvironmentPlus): salabim_plus simulation environment
+            interval (float): length of the intervals of the tracker series, 
+                              best a fraction of a shift (e.g. an hour), no 
+                              detection is made before batch_size * 
+                              min_batches intervals (50 with the defaults) 
+                              so these should be a small part of the run
+            check_interval (float): time between warm-up checks, optional, 
+                                    default=None (interval, the statistics 
+                                    are reset at the first interval the 
+                                    warm-up can be detected at)
+            batch_size (int): observations per MSER batch, optional, 
+                              default=5
+            min_batches (int): batches needed before the warm-up can be 
+                               detected, optional, default=10
+            *arg, **kwargs: sim.Component specific default attributes
+        """
+
+        sim.Component.__init__(self, name='warmup', *args, **kwargs)
+        self.env = env
+        env._add_env_objectlist(self)
+
+        self.interval = interval
+        self.check_interval = check_interval or interval
+        self.batch_size = batch_size
+        self.min_batches = min_batches
+        self.start_time = env.now() # time epoch the series start at
+        self.warmup_time = None # detected end of the warm-up period
+        self.reset_time = None # time epoch the statistics were reset
+        self.trackers = [obj for obj in env._env_objs.values() 
+                         if isinstance(obj, EntityTracker)]
+        for tracker in self.trackers:
+            tracker.start_series(interval)
+
+    @staticmethod
+    def mser(series, batch_size=5, min_batches=10):
+        """
+        MSER truncation point of a series, the number of leading 
+        observations whose removal minimises the standard error of the mean 
+        of the batch means that are left
+
+        Args:
+            series ([float,...]): observations in time order
+            batch_size (int): observations per batch, optional, default=5
+            min_batches (int): batches needed to decide, optional, 
+                               default=10
+
+        Returns:
+            int: observations to truncate, None if there are too few batches 
+                 or the minimum lies in the second half of the series
+        """
+
+        k = len(series) // batch_size
+        if k < min_batches:
+            return None
+
+        batches = np.asarray(series[:k*batch_size], dtype=float)
+        batches = batches.reshape(k, batch_size).mean(axis=1)
+
+        # suffix sums give the statistic for every truncation in one pass
+        remaining = np.arange(k, 0, -1)
+        sums = np.cumsum(batches[::-1])[::-1]
+        squares = np.cumsum((batches**2)[::-1])[::-1]
+        deviations = squares - sums**2 / remaining
+        statistic = deviations / remaining**2
+
+        d = int(np.argmin(statistic[:k-1]))
+        if d > k // 2:
+            return None
+        return d * batch_size
+
+    def detect(self):
+        """
+        returns the end of the warm-up period over all tracker series, None 
+        until it can be detected for every series
+        """
+
+        truncation = 0
+        for tracker in self.trackers:
+            tracker.record_series()
+            for series in (tracker.wip_series, tracker.throughput_series):
+                d = WarmupDetector.mser(series, self.batch_size, 
+                                        self.min_batches)
+                if d is None:
+                    return None
+                truncation = max(truncation, d)
+        return self.start_time + truncation * self.interval
+
+    def reset_stats(self):
+        """
+        resets the tracker statistics and the machine and worker state 
+        accumulators
+        """
+
+        for tracker in self.trackers:
+            tracker.reset_stats()
+        for obj in self.env._env_objs.values():
+            if isinstance(obj, Machine):
+                obj.state.reset_durations()
+            elif isinstance(obj, Worker):
+                obj.state.reset_durations()
+                obj.num_working.reset_durations()
+
+    def process(self):
+        """
+        checks for the warm-up period every check_interval, resets the 
+        statistics once it is detected
+        """
+
+        while self.warmup_time is None:
+            yield self.hold(self.check_interval)
+            self.warmup_time = self.detect()
+
+        self.reset_stats()
+        self.reset_time = self.env.now()
+
+class LightState(object):
+    """
+    Plain attribute stand-in for `sim.State` used by lightweight entities,
+    supports the `state()` and `state.set()` calls made on entity states
+    """
+
+    def __init__(self, env, value, record=False):
+        """
+        setup LightState specific attributes
+
+        Args:
+            env (EnvironmentPlus): salabim_plus simulation environment
+            value (str): initial value of the state
+            record (bool): indicator denoting every state change should be 
+                           kept in history as (time, value), optional, 
+                           default=False
+        """
+
+        self.env = env
+        self.value = value
+        self.history = [(env.now(), value)] if record else None
+
+    def __call__(self):
+        """
+        returns the current value of the state
+        """
+
+        return self.value
+
+    def set(self, value):
+        """
+        sets the value of the state, records the change if indicated
+
+        Args:
+            value (str): new value of the state
+        """
+
+        self.value = value
+        if self.history is not None:
+            self.history.append((self.env.now(), value))
+
+class LoggedState(sim.State):
+    """
+    Extend `sim.State`, records its changes in the environment's event log 
+    when there is one
+    """
+
+    def setup(self):
+        """
+        sim.State setup method, records the creation of the state
+        """
+
+        if self.env.event_log is not None:
+            self.env.log_event('create', self.name(), self())
+
+    def set(self, value=True):
+        """
+        extend `sim.State.set()`, records the value set
+        """
+
+        if self.env.event_log is not None:
+            self.env.log_event('set', self.name(), value)
+        sim.State.set(self, value)
+
+    def trigger(self, value=True, value_after=None, max=sim.inf):
+        """
+        extend `sim.State.trigger()`, records the value triggered
+        """
+
+        if self.env.event_log is not None:
+            self.env.log_event('trigger', self.name(), value)
+        sim.State.trigger(self, value, value_after, max)
+
+class TimedState(LoggedState):
+    """
+    Extend `LoggedState`, keeps the time spent at each value in a running 
+    total per value instead of a monitored history, the salabim monitors of 
+    the state are off unless monitor=True is given
+    """
+
+    def __init__(self, *args, monitor=False, **kwargs):
+        """
+        extend `sim.State.__init__()`, turn the value and waiters monitors 
+        off by default
+        """
+
+        LoggedState.__init__(self, *args, monitor=monitor, **kwargs)
+
+    def setup(self):
+        """
+        sim.State setup method, setup TimedState specific attributes
+        """
+
+        LoggedState.setup(self)
+        self.durations = {} # value to time spent at it, open interval excluded
+        self.since = self.env.now() # time epoch the current value was set
+
+    def set(self, value=True):
+        """
+        extend `LoggedState.set()`, adds the time spent at the previous value 
+        to its total
         """
-        extend `sim.Component.__init__()`, override name variable,
-        setup EntityTracker specific attributes
-        
-        Args:
-            var_name (str): name of the entity
-            env (EnvironmentPlus): salabim_plus simulation environment
-            *arg, **kwargs: sim.Component specific default attributes
+
+        if self._value != value:
+            now = self.env.now()
+            self.durations[self._value] = (
+                self.durations.get(self._value, 0) + now - self.since
+            )
+            self.since = now
+        LoggedState.set(self, value)
+
+    def time_at(self):
         """
-        
-        sim.Component.__init__(self, name='track.'+var_name, *args, **kwargs)
-        
-        self.wip = sim.Queue(self._name+'_wip')
-        self.complete = sim.Queue(self._name+'_complete')
-        self.wip_count = sim.State(self._name+'_wip_count', value=0)
-        self.complete_count = sim.State(self._name+'_complete_count', value=0)
-        self.env = env
-        env._add_env_objectlist(self)
-        
-    def update(self):
+        returns the time spent at each value, the current value included up 
+        to now
+
+        Returns:
+            {value: float}: value to time spent at it
         """
-        updates the tracker states so they are consistent with the tracker 
-        queues
+
+        durations = dict(self.durations)
+        durations[self._value] = (
+            durations.get(self._value, 0) + self.env.now() - self.since
+        )
+        return durations
+
+    def reset_durations(self):
         """
-        
-        self.wip_count.set(len(self.wip))
-        self.complete_count.set(len(self.complete))
-    
+        clears the time spent at each value, the totals start again from now
+        """
+
+        self.durations = {}
+        self.since = self.env.now()
             
 class Entity(sim.Component):
     """
@@ -305,7 +2020,8 @@ class Entity(sim.Component):
     
     def __init__(self, var_name, env, steps, tracker, bom=None, 
                  main_exit=None, cut_queue=False, prepop=False, 
-                 *args, **kwargs):
+                 lightweight=False, record_state=False, in_system=False, 
+                 bom_tracker=None, *args, **kwargs):
         """
         extend `sim.Component.__init__()`, override name variable,
         setup Entity specific attributes
@@ -313,9 +2029,14 @@ class Entity(sim.Component):
         Args:
             var_name (str): name of the entity
             env (EnvironmentPlus): salabim_plus simulation environment
-            steps (dict): nested dictionary mapping out steps an entity will <-- UPDATE!!
-                          take, must follow standard steps dictionary 
-                          formatting (see steps variable documentation)
+            steps ([dict,...]|iterator): steps an entity will take, either a 
+                                         list or an iterator of step 
+                                         dictionaries, an iterator (e.g. a 
+                                         generator) is advanced one step at 
+                                         a time as each step completes, must 
+                                         follow standard steps dictionary 
+                                         formatting (see steps variable 
+                                         documentation)
             tracker (EntityTracker): entity tracker used to route new and 
                                      completed entities
             bom (dict): nested dictionary mapping out build of materials 
@@ -326,42 +2047,96 @@ class Entity(sim.Component):
                                         optional, default=None
             cut_queue (bool): indicator denoting entity should enter queues at
                               head of queue  
+            lightweight (bool): indicator denoting entity status should be a 
+                                plain attribute and step handoff should use 
+                                passivate/activate instead of sim.State 
+                                objects, optional, default=False
+            record_state (bool): indicator denoting a lightweight entity 
+                                 should keep a history of its status 
+                                 changes, optional, default=False
+            in_system (bool): indicator denoting the entity was already 
+                              entered into its tracker (e.g. by a bulk 
+                              order), optional, default=False
+            bom_tracker (BomTracker): tracker that reserved the bom 
+                                      materials of the entity, optional, 
+                                      default=None (nothing reserved)
             *arg, **kwargs: sim.Component specific default attributes
         """
 
         sim.Component.__init__(self, name=var_name, *args, **kwargs)
         
         self.var_name = self._name.replace('.','_') # unique name of that specific entity 
-        self.state = sim.State(self.var_name+'_state', value='in_wip') # entity status
-        self.step_complete = sim.State(self.var_name+'_step_complete') # trigger state to move to next step
+        self.env = env
+        env._add_env_objectlist(self)
+        self.lightweight = lightweight
+        if lightweight:
+            self.state = LightState(env, value='in_wip', record=record_state) # entity status
+            self.step_complete = None # step handoff done through passivate/activate
+        else:
+            self.state = LoggedState(self.var_name+'_state', value='in_wip') # entity status
+            self.step_complete = LoggedState(self.var_name+'_step_complete') # trigger state to move to next step
         self.steps = steps
+        self.current_step = None # step the entity is on, the last step once complete
         self.bom = bom
+        self.bom_tracker = bom_tracker
         self.main_exit = main_exit
         self.cut_queue = cut_queue
         self.prepop = prepop
+        self.in_system = in_system
         self.tracker = tracker
         self.as_built = [] # entity contents that were used to built entity
-        self.env = env
-        env._add_env_objectlist(self)
         
         if self.bom:
             self.get_materials()
-        
+
+    def enter(self, q):
+        """
+        extend `sim.Component.enter()`, records the queue entered in the 
+        event log
+        """
+
+        if self.env.event_log is not None:
+            self.env.log_event('enter', self.name(), q.name())
+        return sim.Component.enter(self, q)
+
+    def enter_at_head(self, q):
+        """
+        extend `sim.Component.enter_at_head()`, records the queue entered in 
+        the event log
+        """
+
+        if self.env.event_log is not None:
+            self.env.log_event('enter', self.name(), q.name())
+        return sim.Component.enter_at_head(self, q)
+
+    def leave(self, q=None):
+        """
+        extend `sim.Component.leave()`, records the queue left in the event 
+        log, leaving all queues records each of them
+        """
+
+        if q is not None and self.env.event_log is not None:
+            self.env.log_event('leave', self.name(), q.name())
+        return sim.Component.leave(self, q)
+
     def process(self):
         """
         main sim.Component process to run on instantiation, gets material and 
         follows steps given to process part 
         """
         
-        self.enter_system()
+        if not self.in_system:
+            self.enter_system()
         
 #         if self.bom:
 #             yield from self.get_materials()
-        if not self.prepop:    
+        if self.prepop:
+            self.current_step = self.steps[-1]
+        else:    
             yield from self.process_part()
         
-        if not isinstance(self.steps[-1]['route_to'], str):
-            self.push(to_inv=self.steps[-1]['route_to'])
+        if not isinstance(self.current_step['route_to'], str):
+            self.push(to_inv=self.current_step['route_to'])
 
         self.leave_system()
         self.state.set('complete')
@@ -398,8 +2173,10 @@ class Entity(sim.Component):
         for step in self.steps:
             self.current_step = step
             
-            # route to first available machine when MachineGroup is indicated 
-            if isinstance(step['location'], MachineGroup):
+            # route to first available machine when MachineGroup is indicated,
+            # unless its machines pull from a shared group queue
+            if (isinstance(step['location'], MachineGroup) 
+                and not step['location'].shared_queue):
                 step['location'] = (
                     step['location'].find_first_available()
                 )
@@ -409,11 +2186,26 @@ class Entity(sim.Component):
                 self.enter_at_head(step['location'].queue)
             else:
                 self.enter(step['location'].queue)
+            step['location'].queue_entered(self)
             
             self.state.set('waiting') # <<-- insert a get_wait_type statement based on machine state
             step['location'].in_queue.trigger(max=1)
-            yield self.wait(self.step_complete)
+            if self.lightweight:
+                yield self.passivate() # reactivated by complete_step()
+            else:
+                yield self.wait(self.step_complete)
             yield self.hold(step['transit_time'])
+
+    def complete_step(self):
+        """
+        signals the entity that the machine processing its current step has 
+        finished, so it can move on to the next step
+        """
+
+        if self.lightweight:
+            self.activate()
+        else:
+            self.step_complete.trigger(max=1)
             
     def push(self, to_inv):
         """
@@ -428,10 +2220,13 @@ class Entity(sim.Component):
         
     def pull(self, from_inv):
         """
-        pulls an entity from the inventory queue indicated in bom
+        pulls an entity from the inventory queue indicated in bom, consumes 
+        a unit of the reservation made for it if any
         """
         
-        self.as_built.append(from_inv.queue.pop())
+        self.as_built.append(from_inv.take())
+        if self.bom_tracker is not None:
+            self.bom_tracker.consume(from_inv)
         from_inv.entity_left()
         
     def enter_system(self):
@@ -439,8 +2234,7 @@ class Entity(sim.Component):
         updates metrics that track entities when an entity enters the sim.env
         """
         
-        self.enter(self.tracker.wip)
-        self.tracker.update()
+        self.tracker.entity_entered(self)
         
     def leave_system(self):
         """
@@ -448,9 +2242,8 @@ class Entity(sim.Component):
         process in sim.env
         """
         
-        self.leave(self.tracker.wip)
-        self.enter(self.tracker.complete)
-        self.tracker.update()
+        self.tracker.entity_left(self)
+        self.env._remove_entity(self)
          
 # Does it make send to make worker a sim.Component for WorkerGroups???, but what about benefits of sim.Resource 
 # class Worker(sim.Component):
@@ -488,12 +2281,17 @@ class Machine(sim.Component):
         sim.Component.__init__(self, name=var_name, *args, **kwargs)
         
         self.var_name = self._name.replace('.','_') # unique name of that specific machine 
-        self.queue = sim.Queue(self.var_name+'_queue') # queue of entities to work on
-        self.in_queue = sim.State(self.var_name+'_in_queue') # trigger state to work on an entity
-        self.state = sim.State(self.var_name+'_status', value='idle') # machine status
-        self.time_remaining = 0 # time until machine finishes entity being process
         self.env = env
         env._add_env_objectlist(self)
+        self.queue = sim.Queue(self.var_name+'_queue') # queue of entities to work on
+        self.in_queue = LoggedState(self.var_name+'_in_queue') # trigger state to work on an entity
+        self.state = TimedState(self.var_name+'_status', value='idle') # machine status
+        self.time_remaining = 0 # time until machine finishes entity being process
+        self.queued_work = 0 # processing time of the entities in its queue
+        self.groups = [] # MachineGroups dispatching to the machine
+        self.shared_groups = [] # MachineGroups whose shared queue the machine pulls from
+        self.in_queues = [self.in_queue] # trigger states to wait on when idle
+        self.calendar_hold = None # worker calendar the current hold runs on
         
     def process(self):
         """
@@ -504,13 +2302,33 @@ class Machine(sim.Component):
         
         while True:
             # sit idle until entity to work on 
-            if len(self.queue) == 0:
+            source = self.find_source()
+            while source is None:
                 self.state.set('waiting_material')
-                yield self.wait(self.in_queue)
+                yield self.wait(*self.in_queues)
+                source = self.find_source()
 
             # run machine
-            self.in_process = self.queue.pop()
+            self.in_process = source.queue.pop()
+            source.queue_left(self.in_process)
             yield from self.run(**self.in_process.current_step)
+
+    def find_source(self):
+        """
+        finds where the next entity to work on comes from, its own queue 
+        first, then the shared queues of its MachineGroups in order
+
+        Returns:
+            Machine|MachineGroup: location whose queue has an entity, None if
+                                  all queues are empty
+        """
+
+        if len(self.queue) > 0:
+            return self
+        for group in self.shared_groups:
+            if len(group.queue) > 0:
+                return group
+        return None
             
     def run(self, location, setup_time, run_time, teardown_time, transit_time,
             worker=None, manned=None, **kwargs):
@@ -535,24 +2353,37 @@ class Machine(sim.Component):
         """
 
         self.in_process.state.set('processing')
+
+        # a step without a worker or changeover has a single phase, it goes 
+        # straight to one hold without the setup and teardown generators
+        if worker is None and setup_time == 0 and teardown_time == 0:
+            self.state.set('running')
+            self.update_time_remaining(run_time)
+            yield self.hold(run_time)
+            self.update_time_remaining(-run_time)
+            self.in_process.complete_step()
+            return
+
         self.update_time_remaining(setup_time + run_time + teardown_time)
         
         yield from self.setup_machine(setup_time, worker, manned) 
-        yield from self.process_entity(run_time)
+        yield from self.process_entity(run_time, worker if manned else None)
         yield from self.teardown_machine(teardown_time, worker, manned)
         
-        self.in_process.step_complete.trigger(max=1)
+        self.in_process.complete_step()
         
-    def process_entity(self, run_time):
+    def process_entity(self, run_time, worker=None):
         """
         process an entity through the machine
         
         Args:
             run_time (int): time required to process an entity
+            worker (Worker): worker tied to the machine while processing, 
+                             optional, default=None
         """
         
         self.state.set('running')
-        yield self.hold(run_time)
+        yield from self.hold_on_shift(run_time, worker)
         self.update_time_remaining(-run_time)
         
     def setup_machine(self, setup_time, worker=None, manned=None):
@@ -577,7 +2408,7 @@ class Machine(sim.Component):
                 worker.update_num_working()
 
             self.state.set('changeover_setup')
-            yield self.hold(setup_time)
+            yield from self.hold_on_shift(setup_time, worker)
             self.update_time_remaining(-setup_time)
 
             if worker and not manned:
@@ -631,7 +2462,7 @@ class Machine(sim.Component):
                 worker.update_num_working()
 
             self.state.set('changeover_teardown')
-            yield self.hold(teardown_time)
+            yield from self.hold_on_shift(teardown_time, worker)
             self.update_time_remaining(-teardown_time)
 
             if worker:
@@ -661,6 +2492,53 @@ class Machine(sim.Component):
         #     worker.update_num_working()
              
     
+    def hold_on_shift(self, duration, worker=None):
+        """
+        holds the machine for duration of on-shift time of the worker it 
+        claims, with a calendar the completion time across off-shift windows 
+        is computed up front so the shift controller does not have to 
+        interrupt and resume the machine
+        
+        Args:
+            duration (int): on-shift time to hold the machine for
+            worker (Worker): worker claimed during the hold, optional, 
+                             default=None
+        """
+        
+        calendar = worker.calendar if worker else None
+        if calendar is None or duration <= 0:
+            yield self.hold(duration)
+            return
+        
+        # completes ahead of a shift change at the same time epoch
+        self.calendar_hold = calendar
+        yield self.hold(till=calendar.add_on_time(self.env.now(), duration), 
+                        priority=-1)
+        self.calendar_hold = None
+    
+    def state_durations(self):
+        """
+        returns the time the machine spent in each status
+
+        Returns:
+            {str: float}: status to time spent in it
+        """
+
+        return self.state.time_at()
+
+    def utilization(self):
+        """
+        returns the fraction of time the machine spent in each status
+        
+        Returns:
+            {str: float}: status to fraction of time spent in it
+        """
+
+        durations = self.state_durations()
+        total = sum(durations.values())
+        return {status: (duration / total if total > 0 else 0.) 
+                for status, duration in durations.items()}
+
     def update_time_remaining(self, time):
         """
         updates the time required on the machine until an entity has finished 
@@ -671,6 +2549,48 @@ class Machine(sim.Component):
         """
         
         self.time_remaining += time 
+        self.update_groups()
+
+    def queue_entered(self, entity):
+        """
+        updates the machine queue metrics when an entity enters its queue
+
+        Args:
+            entity (Entity): entity that entered the queue
+        """
+
+        self.queued_work += self.get_work(entity.current_step)
+        self.update_groups()
+
+    def queue_left(self, entity):
+        """
+        updates the machine queue metrics when an entity leaves its queue
+
+        Args:
+            entity (Entity): entity that left the queue
+        """
+
+        self.queued_work -= self.get_work(entity.current_step)
+        self.update_groups()
+
+    def update_groups(self):
+        """
+        updates the dispatch index of every MachineGroup the machine is in
+        """
+
+        for group in self.groups:
+            group.index.update(self)
+
+    @staticmethod
+    def get_work(step):
+        """
+        get the machine time required by a step
+
+        Args:
+            step (dict): step dictionary of an entity
+        """
+
+        return step['setup_time'] + step['run_time'] + step['teardown_time']
         
     def get_wait_type(self, worker):
         """
@@ -686,13 +2606,154 @@ class Machine(sim.Component):
         else:
             return 'waiting_worker'
 
+class DispatchIndex(object):
+    """
+    Heap of the machines of a MachineGroup keyed by a DispatchPolicy, 
+    machines push a new entry whenever their key changes and outdated 
+    entries are dropped lazily when they reach the top
+    """
+
+    def __init__(self, machines, policy):
+        """
+        setup DispatchIndex specific attributes
+
+        Args:
+            machines ([Machine,...]): machines in the index, list order 
+                                      breaks ties between equal keys
+            policy (DispatchPolicy): policy providing the machine keys
+        """
+
+        self.policy = policy
+        self.order = {machine: i for i, machine in enumerate(machines)}
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        rebuilds the heap from the current machine keys
+        """
+
+        self.version = 0
+        self.current = {} # machine to the version of its valid heap entry
+        self.heap = []
+        for machine in self.order:
+            self.version += 1
+            self.current[machine] = self.version
+            self.heap.append((self.policy.key(machine), self.order[machine], 
+                              self.version, machine))
+        heapq.heapify(self.heap)
+
+    def update(self, machine):
+        """
+        pushes the current key of a machine onto the heap
+
+        Args:
+            machine (Machine): machine whose key changed
+        """
+
+        self.version += 1
+        self.current[machine] = self.version
+        heapq.heappush(self.heap, (self.policy.key(machine), 
+                                   self.order[machine], self.version, machine))
+
+        # drop the outdated entries once they outnumber the machines
+        if len(self.heap) > 4 * len(self.order):
+            self.rebuild()
+
+    def first(self):
+        """
+        returns the machine with the lowest key
+        """
+
+        heap = self.heap
+        while self.current[heap[0][3]] != heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0][3]
+
+class DispatchPolicy(abc.ABC):
+    """
+    Base class of the MachineGroup dispatch policies, machines with the 
+    lowest key are dispatched to first
+    """
+
+    @abc.abstractmethod
+    def key(self, machine):
+        """
+        get the dispatch key of a machine
+
+        Args:
+            machine (Machine): machine within the group
+        """
+
+    def dispatched(self, group, machine):
+        """
+        updates the policy after an entity has been dispatched to a machine
+
+        Args:
+            group (MachineGroup): group that dispatched the entity
+            machine (Machine): machine the entity was dispatched to
+        """
+
+        pass
+
+class ShortestQueue(DispatchPolicy):
+    """
+    Dispatch to the machine with the shortest queue, machines with an empty 
+    queue are ordered on their processing time remaining
+    """
+
+    def key(self, machine):
+
+        queue_length = len(machine.queue)
+        if queue_length == 0:
+            return (0, machine.time_remaining)
+        return (queue_length, 0)
+
+class LeastWorkRemaining(DispatchPolicy):
+    """
+    Dispatch to the machine with the least processing time remaining, 
+    including the processing time of the entities in its queue
+    """
+
+    def key(self, machine):
+
+        return machine.time_remaining + machine.queued_work
+
+class RoundRobin(DispatchPolicy):
+    """
+    Dispatch to the machines in turn, the least recently dispatched to 
+    machine goes first
+    """
+
+    def __init__(self):
+
+        self.dispatch_count = 0
+        self.last_dispatch = {} # machine to the dispatch count it was last used
+
+    def key(self, machine):
+
+        return self.last_dispatch.get(machine, 0)
+
+    def dispatched(self, group, machine):
+
+        self.dispatch_count += 1
+        self.last_dispatch[machine] = self.dispatch_count
+        group.index.update(machine)
+
 class MachineGroup(sim.Component):
     """
     Extend `sim.Component`
     A group of Machines that can conduct a common process
     """
+
+    # 'shortest_queue','least_work','round_robin'
+    dispatch_policies = {
+        'shortest_queue': ShortestQueue,
+        'least_work': LeastWorkRemaining,
+        'round_robin': RoundRobin
+    }
     
-    def __init__(self, var_name, env, machines, *args, **kwargs):
+    def __init__(self, var_name, env, machines, dispatch='shortest_queue', 
+                 shared_queue=False, *args, **kwargs):
         """
         extend `sim.Component.__init__()`, override name variable,
         setup MachineGroup specific attributes
@@ -701,65 +2762,284 @@ class MachineGroup(sim.Component):
             var_name (str): name of the machine group
             env (EnvironmentPlus): salabim_plus simulation environment
             machines ([Machine,...]): list of machines consisting of the group
+            dispatch (str|DispatchPolicy): predefined policy used to pick the 
+                                           machine an entity is routed to, 
+                                           available policies: 
+                                           ('shortest_queue','least_work',
+                                           'round_robin'), or a 
+                                           DispatchPolicy instance, ignored 
+                                           with a shared_queue, optional, 
+                                           default='shortest_queue'
+            shared_queue (bool): indicator denoting entities should wait in 
+                                 one group queue that idle machines pull 
+                                 from, instead of being dispatched to a 
+                                 machine queue on arrival, optional, 
+                                 default=False
         """
         
         sim.Component.__init__(self, name=var_name, *args, **kwargs)
         self.var_name = var_name
         self.machines = machines
+        self.shared_queue = shared_queue
         self.env = env
         env._add_env_objectlist(self)
+
+        # idle machines pull from the shared queue, no dispatching needed
+        if shared_queue:
+            self.dispatch = None
+            self.queued_work = 0 # processing time of the entities in the shared queue
+            self.queue = sim.Queue(self.var_name+'_queue') # queue of entities for any machine in the group
+            self.in_queue = LoggedState(self.var_name+'_in_queue') # trigger state for an idle machine to pull an entity
+            for machine in machines:
+                machine.shared_groups.append(self)
+                machine.in_queues.append(self.in_queue)
+        else:
+            # decision tree to initialize the dispatch policy
+            if isinstance(dispatch, DispatchPolicy):
+                self.dispatch = dispatch
+            elif dispatch in self.dispatch_policies:
+                self.dispatch = self.dispatch_policies[dispatch]()
+            # raise error for an unrecognized dispatch policy
+            else:
+                options = list(self.dispatch_policies)
+                raise InputError(dispatch, 'dispatch', options)
+            self.index = DispatchIndex(machines, self.dispatch)
+            for machine in machines:
+                machine.groups.append(self)
         
     def find_first_available(self):
         """
-        finds the machine amongst the group of machines that has the lowest 
-        queue length and the lowest processing time remaining if multiple 
-        machine queues are empty 
+        finds the machine amongst the group of machines to route an entity 
+        to, as ordered by the dispatch policy (by default the lowest queue 
+        length and the lowest processing time remaining if multiple machine 
+        queues are empty)
         """
         
-        # conditional to determine if routing based on queue length should be used (no more than 1 machine has an empty queue) 
-        if (2 > len(
-            [len(machine.queue) for machine in self.machines 
-             if len(machine.queue) == 0]
-            )):
-            # lowest queue length amongst machine queues
-            lowest_queue = min(
-                [len(machine.queue) for machine in self.machines]
-            )
-            # match lowest queue length to its machine
-            for machine in self.machines:
-                if len(machine.queue) == lowest_queue:
-                    return machine
-                
-            raise ComputationalError # value evaluation incorrect, no machine was matched
+        machine = self.index.first()
+        self.dispatch.dispatched(self, machine)
+        return machine
+
+    def queue_entered(self, entity):
+        """
+        updates the group queue metrics when an entity enters the shared 
+        queue
+
+        Args:
+            entity (Entity): entity that entered the queue
+        """
+
+        self.queued_work += Machine.get_work(entity.current_step)
+
+    def queue_left(self, entity):
+        """
+        updates the group queue metrics when an entity leaves the shared 
+        queue
+
+        Args:
+            entity (Entity): entity that left the queue
+        """
+
+        self.queued_work -= Machine.get_work(entity.current_step)
         
-        # routing based on processing time remaining for machines with an empty queue
+class ShiftCalendar(object):
+    """
+    Precompiled on-shift calendar, sorted on/off breakpoints kept as arrays 
+    so on-shift lookups at any time epoch are O(log n)
+    """
+
+    def __init__(self, intervals, holidays=None):
+        """
+        setup ShiftCalendar specific attributes, sorts and merges the 
+        on-shift intervals and removes the holidays from them
+
+        Args:
+            intervals ([(float, float),...]): (start, end) time epochs of the 
+                                              on-shift intervals
+            holidays ([(float, float),...]): (start, end) time epochs of 
+                                             off-shift windows removed from 
+                                             the intervals, optional, 
+                                             default=None
+        """
+
+        merged = []
+        for start, end in sorted(intervals):
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        for off_start, off_end in sorted(holidays or []):
+            kept = []
+            for start, end in merged:
+                if end <= off_start or start >= off_end:
+                    kept.append([start, end])
+                    continue
+                if start < off_start:
+                    kept.append([start, off_start])
+                if end > off_end:
+                    kept.append([off_end, end])
+            merged = kept
+
+        self.starts = np.array([start for start, _ in merged], dtype=float) # on-shift breakpoints
+        self.ends = np.array([end for _, end in merged], dtype=float) # off-shift breakpoints
+        self.cum_on = np.concatenate(
+            ([0.], np.cumsum(self.ends - self.starts))
+        ) # on-shift time accumulated before each interval (and in total)
+
+    @classmethod
+    def from_shifts(cls, shifts, shift_type, start_time, horizon, 
+                    holidays=None):
+        """
+        compiles the shifts a ShiftController would walk into a calendar
+
+        Args:
+            shifts (dict|[dict,...]): shifts dictionary (or list of them, see 
+                                      `misc_tools.make_shifts`) with 
+                                      shift_duration and off_duration
+            shift_type (str): predefined method in which worker works its 
+                              shifts, available methods: ('continuous',
+                              'pattern','custom')
+            start_time (int): time epoch the first shift starts
+            horizon (int): time epoch to compile the calendar until
+            holidays ([(float, float),...]): (start, end) time epochs of 
+                                             off-shift windows, optional, 
+                                             default=None
+
+        Returns:
+            ShiftCalendar: the compiled calendar
+        """
+
+        # decision tree to determine the order the shifts are worked in
+        if shift_type == 'continuous':
+            sequence = itertools.repeat(shifts)
+        elif shift_type == 'pattern':
+            sequence = itertools.cycle(shifts)
+        elif shift_type == 'custom':
+            sequence = iter(shifts)
+        # raise error for an unrecognized shift_type method
         else:
-            # only machines with an empty queue
-            open_machines = (
-                [machine for machine in self.machines 
-                 if len(machine.queue) == 0]
-            )
-            # print(open_machines)
-            # print([machine.time_remaining for machine in open_machines])
-            # lowest time amongst the empty queue machines
-            lowest_time_remaining = min(
-                [machine.time_remaining for machine in open_machines]
-            )
-            # match lowest time to its machine
-            for machine in open_machines:
-                if machine.time_remaining == lowest_time_remaining:
-                    return machine
-                
-            raise ComputationalError # value evaluation incorrect, no machine was matched
-        
+            options = ['continuous','pattern','custom']
+            raise InputError(shift_type, 'shift_type', options)
+
+        intervals = []
+        time = start_time
+        for shift in sequence:
+            if time >= horizon:
+                break
+            if shift['shift_duration'] + shift['off_duration'] <= 0:
+                raise InputError(shift, 'shifts', ['positive shift length'])
+            if shift['shift_duration'] > 0:
+                intervals.append(
+                    (time, min(time + shift['shift_duration'], horizon))
+                )
+            time += shift['shift_duration'] + shift['off_duration']
+
+        return cls(intervals, holidays)
+
+    def __len__(self):
+
+        return len(self.starts)
+
+    def intervals(self):
+        """
+        returns the on-shift intervals as a list of (start, end) time epochs
+        """
+
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def _index(self, time):
+        """
+        returns the index of the last interval starting at or before time, 
+        -1 if there is none
+        """
+
+        return int(np.searchsorted(self.starts, time, side='right')) - 1
+
+    def is_on_shift(self, time):
+        """
+        checks whether a time epoch falls on shift
+
+        Args:
+            time (float): time epoch to look up
+        """
+
+        idx = self._index(time)
+        return idx >= 0 and time < self.ends[idx]
+
+    def next_on_shift(self, time):
+        """
+        returns the first on-shift time epoch at or after time, inf if the 
+        calendar has no more shifts
+
+        Args:
+            time (float): time epoch to look up
+        """
+
+        idx = self._index(time)
+        if idx >= 0 and time < self.ends[idx]:
+            return time
+        if idx + 1 < len(self.starts):
+            return float(self.starts[idx+1])
+        return float('inf')
+
+    def next_off_shift(self, time):
+        """
+        returns the first off-shift time epoch at or after time
+
+        Args:
+            time (float): time epoch to look up
+        """
+
+        idx = self._index(time)
+        if idx >= 0 and time < self.ends[idx]:
+            return float(self.ends[idx])
+        return time
+
+    def on_time(self, time):
+        """
+        returns the on-shift time accumulated from the start of the calendar 
+        until time
+
+        Args:
+            time (float): time epoch to look up
+        """
+
+        idx = self._index(time)
+        if idx < 0:
+            return 0.
+        return float(self.cum_on[idx] 
+                     + min(time, self.ends[idx]) - self.starts[idx])
+
+    def add_on_time(self, time, duration):
+        """
+        returns the time epoch at which duration of on-shift time has passed 
+        after time, off-shift windows in between are skipped, inf if the 
+        calendar runs out of shifts first
+
+        Args:
+            time (float): time epoch to start from
+            duration (float): on-shift time to pass
+        """
+
+        if duration <= 0:
+            return time
+        target = self.on_time(time) + duration
+        if target > self.cum_on[-1]:
+            return float('inf')
+        # first interval whose accumulated on-shift time reaches the target
+        idx = int(np.searchsorted(self.cum_on, target, side='left')) - 1
+        return float(self.starts[idx] + target - self.cum_on[idx])
+
 class ShiftController(sim.Component):
     """
     Extend `sim.Component` 
     """
     
-    # 'continuous','pattern','custom'
-    def __init__(self, worker, env, start_time, shifts, shift_type, *args, 
-                 **kwargs):
+    # 'continuous','pattern','custom','calendar'
+    def __init__(self, worker, env, start_time, shifts, shift_type, 
+                 horizon=None, holidays=None, *args, **kwargs):
         """
         extend `sim.Component.__init__()`, override name variable,
         setup ShiftController specific attributes
@@ -773,7 +3053,15 @@ class ShiftController(sim.Component):
                            formatting (see shifts variable documentation)
             shift_type (str): predefined method in which worker works its 
                               shifts, available methods: ('continuous',
-                            'pattern','custom')
+                            'pattern','custom','calendar'), `calendar` 
+                            takes a ShiftCalendar as shifts
+            horizon (int): time epoch to compile the shifts into a 
+                           ShiftCalendar until, the controller then runs 
+                           from the calendar, optional, default=None
+            holidays ([(float, float),...]): (start, end) time epochs of 
+                                             off-shift windows (only with a 
+                                             horizon, optional, 
+                                             default=None)
             *arg, **kwargs: sim.Component specific default attributes
         """
         
@@ -786,15 +3074,27 @@ class ShiftController(sim.Component):
         self.shift_type = shift_type
         self.worker_cap = worker.capacity() # number of workers in worker sim.Resource
         self.shift_num = 0 # placeholder indicating how many shifts have passed
+        self.on_shift = True # indicator whether the worker is in the env
         self.env = env
         env._add_env_objectlist(self)
         
         # decision tree to verify valid shift_type method
-        options = ['continuous','pattern','ordered']
+        options = ['continuous','pattern','custom','calendar']
         if shift_type in options:
             pass
         else:
             raise InputError(shift_type, 'shift_type', options) # raise error for an unrecognized shift_type method 
+
+        # calendar the shifts are run from, shared with the worker
+        if shift_type == 'calendar':
+            self.calendar = shifts
+        elif horizon is not None:
+            self.calendar = ShiftCalendar.from_shifts(
+                shifts, shift_type, start_time, horizon, holidays
+            )
+        else:
+            self.calendar = None
+        worker.calendar = self.calendar
     
     def start_up(self):
         """
@@ -844,33 +3144,103 @@ class ShiftController(sim.Component):
         self.worker.state.set('on_clock') # update worker state
         yield self.hold(self.shift_duration) # run shift
         
-        # stop all machines serviced by the worker at end of shift
-        tmp = {}
+        self.end_shift()
+        yield self.hold(self.off_duration) # unscheduled time
+        self.start_shift()
+
+    def end_shift(self):
+        """
+        takes the worker off shift, stopping all machines it services
+        """
+        
+        # stop all machines serviced by the worker at end of shift, machines 
+        # holding on the worker calendar already finish after the shift break
+        self.saved_states = {}
+        self.interrupted = set()
         for machine in self.worker.claimers():
-            machine.interrupt()
-            tmp[machine] = copy.deepcopy(machine.state()) # save machine state for start up
+            if machine.calendar_hold is None:
+                machine.interrupt()
+                self.interrupted.add(machine)
+            self.saved_states[machine] = copy.deepcopy(machine.state()) # save machine state for start up
             machine.state.set('idle') # update machine state
             
+        self.on_shift = False
         self.worker.set_capacity(0) # remove worker from env
         self.worker.update_num_working(0) # zero out worker allocation level
         
         self.worker.state.set('off_clock') # update worker state
-        yield self.hold(self.off_duration) # unscheduled time
+
+    def start_shift(self):
+        """
+        puts the worker back on shift, starting the machines it services
+        """
         
         # start all machines back up at start of next shift
         for machine in self.worker.claimers():
-            machine.resume()
-            machine.state.set(copy.deepcopy(tmp[machine])) # update machine state
+            if machine in self.interrupted:
+                machine.resume()
+            machine.state.set(copy.deepcopy(self.saved_states[machine])) # update machine state
         
+        self.on_shift = True
         self.worker.set_capacity(self.worker_cap) # place worker back in env
         self.worker.update_num_working() # reinstate worker allocation level
-        
-        
+
+    def calendar_shifts(self):
+        """
+        run the shifts of the calendar, stays off shift once it runs out
+        """
+
+        on_shift = self.calendar.is_on_shift(self.env.now())
+        if self.on_shift and not on_shift:
+            self.end_shift()
+        elif on_shift and not self.on_shift:
+            self.start_shift()
+
+        for start, end in self.calendar.intervals():
+            if end <= self.env.now():
+                continue
+            if start > self.env.now():
+                yield self.hold(till=start) # unscheduled time
+                self.start_shift()
+            self.worker.state.set('on_clock') # update worker state
+            yield self.hold(till=end) # run shift
+            self.end_shift()
+
+        yield self.passivate()
+
+    def set_calendar(self, calendar):
+        """
+        replaces the calendar mid-run, machines holding on the old calendar 
+        are rescheduled to finish their remaining on-shift time on the new 
+        one and the controller restarts from the new calendar
+
+        Args:
+            calendar (ShiftCalendar): calendar to run the shifts from
+        """
+
+        now = self.env.now()
+        for machine in self.worker.claimers():
+            old = machine.calendar_hold
+            if old is None:
+                continue
+            remaining = old.on_time(machine.scheduled_time()) - old.on_time(now)
+            machine.calendar_hold = calendar
+            machine.activate(at=calendar.add_on_time(now, remaining), 
+                             priority=-1)
+
+        self.calendar = calendar
+        self.worker.calendar = calendar
+        self.activate(process='calendar_shifts')
+
     def work(self):
         """
         activates shift controller to control shifts in which workers work
         """
         
+        if self.calendar is not None:
+            yield from self.calendar_shifts()
+            return
+
         yield from self.start_up() # delay process to start_up time epoch
 
         while True:
@@ -905,12 +3275,14 @@ class Worker(sim.Resource):
         
         sim.Resource.__init__(self, name=var_name, capacity=capacity, *args, 
                               **kwargs)
-        
-        self.state = sim.State(self._name+'_status', value='off_clock') # worker status
-        self.num_working = sim.State(self._name+'_num_working', value=0) # state indicating how many workers are working
         self.env = env
         env._add_env_objectlist(self)
         
+        self.state = TimedState(self._name+'_status', value='off_clock') # worker status
+        self.num_working = TimedState(self._name+'_num_working', value=0) # state indicating how many workers are working
+        self.worker_cap = capacity # number of workers when on shift
+        self.calendar = None # ShiftCalendar of the worker, set by its ShiftController
+        
     def update_num_working(self, value=None):
         """
         updates the number of workers that are working
@@ -925,7 +3297,96 @@ class Worker(sim.Resource):
         else:
             # use the length of the sim.Resource.claimers list if no value indicated, indicates what sim.Components have claimed a resource
             self.num_working.set(len(self.claimers()))
+
+    def state_durations(self):
+        """
+        returns the time the worker spent in each status
+
+        Returns:
+            {str: float}: status to time spent in it
+        """
+
+        return self.state.time_at()
+
+    def utilization(self):
+        """
+        returns the fraction of worker time (time times worker_cap) that was 
+        utilized, unutilized while on clock and off clock
+
+        Returns:
+            {str: float}: category to fraction of worker time
+        """
+
+        status = self.state_durations()
+        utilized = sum(num * duration for num, duration 
+                       in self.num_working.time_at().items())
+        total = sum(status.values()) * self.worker_cap
+        if total <= 0:
+            return {'utilized': 0., 'unutilized': 0., 'off_clock': 0.}
+
+        on_clock = status.get('on_clock', 0) * self.worker_cap
+        return {
+            'utilized': utilized / total,
+            'unutilized': (on_clock - utilized) / total,
+            'off_clock': status.get('off_clock', 0) * self.worker_cap / total,
+        }
             
+class TokenStock(object):
+    """
+    Inventory kept as counts instead of components, runs of tokens share an 
+    optional lightweight record, a component is only made when a token is 
+    taken
+    """
+
+    def __init__(self):
+        """
+        setup TokenStock specific attributes
+        """
+
+        self.runs = deque() # [qty, record] runs of tokens, oldest first
+        self.count = 0
+
+    def __len__(self):
+
+        return self.count
+
+    def add(self, qty, record=None):
+        """
+        adds tokens to the stock
+
+        Args:
+            qty (int): number of tokens to add
+            record (any): lightweight record of the tokens, e.g. the name of 
+                          the entity they stand for, optional, default=None
+        """
+
+        if qty <= 0:
+            return
+        if self.runs and self.runs[-1][1] is record:
+            self.runs[-1][0] += qty
+        else:
+            self.runs.append([qty, record])
+        self.count += qty
+
+    def take(self):
+        """
+        takes the oldest token from the stock
+
+        Returns:
+            sim.Component: component made for the token, its record is kept 
+                           in the record attribute
+        """
+
+        run = self.runs[0]
+        run[0] -= 1
+        if run[0] == 0:
+            self.runs.popleft()
+        self.count -= 1
+
+        item = sim.Component(name='dummy')
+        item.record = run[1]
+        return item
+
 class Kanban(sim.Component):
     """
     Extend `sim.Component` 
@@ -947,6 +3408,8 @@ class Kanban(sim.Component):
         """
         
         sim.Component.__init__(self, name=var_name+'_kanban', *args, **kwargs)
+        self.env = env
+        env._add_env_objectlist(self)
         
         self.order_gen = kanban_attr['order_gen'] # EntityGenerator to order entities from
         self.order_point = kanban_attr['order_point'] # threshold in which an order shall be made
@@ -954,11 +3417,13 @@ class Kanban(sim.Component):
         self.init_qty = kanban_attr['init_qty'] # initial quantity to order at beginning of simulation
         self.warmup_time = kanban_attr['warmup_time'] # time to wait in beginning of simulation before evaluating whether an order should be made 
         self.queue = sim.Queue(self._name+'_queue') # kanban queue
-        self.count = sim.State(self._name+'_count', value=0) # state indicating how many entities are in kanban queue
-        self.on_order = sim.State(self._name+'_on_order', value=0) # state indicating how many entities are on order
-        self.total_inv = sim.State(self._name+'_total_inv', value=0) # sum of entities on order and entities in kanban queue
-        self.env = env
-        env._add_env_objectlist(self)
+        self.count = LoggedState(self._name+'_count', value=0) # state indicating how many entities are in kanban queue
+        self.on_order = LoggedState(self._name+'_on_order', value=0) # state indicating how many entities are on order
+        self.total_inv = LoggedState(self._name+'_total_inv', value=0) # sum of entities on order and entities in kanban queue
+        self.tokens = TokenStock() # entities in kanban kept as counts
+        self.reserved = 0 # entities in kanban queue reserved by a bom
+        self.reservations = {} # BomTracker to entities it has reserved
+        self.bom_trackers = [] # BomTrackers notified when the kanban queue changes
         
     def process(self):
         """
@@ -972,14 +3437,11 @@ class Kanban(sim.Component):
         # self.entity_ordered(self.init_qty) 
         # yield self.hold(self.warmup_time)
 
-        # prepopulate entitys
+        # prepopulate entitys as tokens
         if self.init_qty > 0:
         #     # yield from self.populate()
         #     self.on_order.set(self.init_qty)
-            for _ in range(self.init_qty):
-                self.queue.append(sim.Component(name='dummy'))
-        #         self.order_gen.populate_inv(location=self.env.objs[self._name])
-            self.update_inv()
+            self.add_tokens(self.init_qty)
 
         while True:
             yield self.wait((self.total_inv, lambda v, c, s: v < self.order_point)) # wait until the inventory level falls below the indicated threshold
@@ -990,8 +3452,7 @@ class Kanban(sim.Component):
         """
         """
 
-        for _ in range(self.init_qty):
-            self.order_gen.populate_inv(location=self.env._env_objs[self._name])
+        self.order_gen.populate_inv(location=self, qty=self.init_qty)
     
     def entity_ordered(self, qty):
         """
@@ -1025,8 +3486,68 @@ class Kanban(sim.Component):
         updates the inventory metrics of the kanban
         """
 
-        self.count.set(len(self.queue))
+        self.count.set(self.level())
         self.total_inv.set(self.on_order()+self.count())
+        self.notify_bom()
+
+    def available(self):
+        """
+        returns the number of entities in the kanban queue not reserved
+        """
+
+        return self.level() - self.reserved
+
+    def level(self):
+        """
+        returns the number of entities in the kanban, queued and tokens
+        """
+
+        return len(self.queue) + len(self.tokens)
+
+    def capacity(self):
+        """
+        returns an estimate of the most entities the kanban can come to 
+        hold, the stock it refills to (orders are only sent while below the 
+        order point) or the stock it has and has on order now if that is 
+        more (e.g. its initial stock or entities that entered without an 
+        order)
+
+        Returns:
+            int: max(order_point - 1 + order_qty, total_inv)
+        """
+
+        return max(self.order_point - 1 + self.order_qty, self.total_inv())
+
+    def add_tokens(self, qty, record=None):
+        """
+        adds entities to the kanban as tokens
+
+        Args:
+            qty (int): number of entities to add
+            record (any): lightweight record of the entities, optional, 
+                          default=None
+        """
+
+        self.tokens.add(qty, record)
+        self.update_inv()
+
+    def take(self):
+        """
+        takes the oldest entity out of the kanban, tokens are taken first 
+        and only then made into a component
+        """
+
+        if len(self.tokens) > 0:
+            return self.tokens.take()
+        return self.queue.pop()
+
+    def notify_bom(self):
+        """
+        notifies the BomTrackers using the kanban of a change
+        """
+
+        for bom_tracker in self.bom_trackers:
+            bom_tracker.update()
             
 class Storage(sim.Component):
     """
@@ -1046,12 +3567,16 @@ class Storage(sim.Component):
         
         sim.Component.__init__(self, name=var_name+'_storage', *args, 
                                **kwargs)
-        
-        self.queue = sim.Queue(self._name+'_queue') # storage queue
-        self.count = sim.State(self._name+'_count', value=0) # quantity inside storage queue
         self.env = env
         env._add_env_objectlist(self)
         
+        self.queue = sim.Queue(self._name+'_queue') # storage queue
+        self.count = LoggedState(self._name+'_count', value=0) # quantity inside storage queue
+        self.tokens = TokenStock() # entities in storage kept as counts
+        self.reserved = 0 # entities in storage queue reserved by a bom
+        self.reservations = {} # BomTracker to entities it has reserved
+        self.bom_trackers = [] # BomTrackers notified when the storage queue changes
+        
     def process(self):
         """
         main sim.Component process to run on instantiation
@@ -1064,11 +3589,596 @@ class Storage(sim.Component):
         updates the storage queue count when an entity enters
         """
 
-        self.count.set(len(self.queue))
+        self.count.set(self.level())
+        self.notify_bom()
 
     def entity_left(self):
         """
         updates the storage queue count when an entity leaves
         """
 
-        self.count.set(len(self.queue))
\ No newline at end of file
+        self.count.set(self.level())
+        self.notify_bom()
+
+    def available(self):
+        """
+        returns the number of entities in the storage queue not reserved
+        """
+
+        return self.level() - self.reserved
+
+    def level(self):
+        """
+        returns the number of entities in the storage, queued and tokens
+        """
+
+        return len(self.queue) + len(self.tokens)
+
+    def capacity(self):
+        """
+        returns the most entities the storage holds, storage is unbounded
+
+        Returns:
+            None
+        """
+
+        return None
+
+    def add_tokens(self, qty, record=None):
+        """
+        adds entities to the storage as tokens
+
+        Args:
+            qty (int): number of entities to add
+            record (any): lightweight record of the entities, optional, 
+                          default=None
+        """
+
+        self.tokens.add(qty, record)
+        self.count.set(self.level())
+        self.notify_bom()
+
+    def take(self):
+        """
+        takes the oldest entity out of the storage, tokens are taken first 
+        and only then made into a component
+        """
+
+        if len(self.tokens) > 0:
+            return self.tokens.take()
+        return self.queue.pop()
+
+    def notify_bom(self):
+        """
+        notifies the BomTrackers using the storage of a change
+        """
+
+        for bom_tracker in self.bom_trackers:
+            bom_tracker.update()
+
+def _t_quantile(p, df):
+    """
+    returns the p quantile of the Student t distribution with df degrees of 
+    freedom, exact for df 1 and 2, else a Cornish-Fisher expansion around 
+    the normal quantile (accurate to about 1e-3 from df=3 on)
+
+    Args:
+        p (float): probability
+        df (int): degrees of freedom
+    """
+
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2*p - 1) / math.sqrt(2 * p * (1 - p))
+
+    z = statistics.NormalDist().inv_cdf(p)
+    return (
+        z 
+        + (z**3 + z) / (4 * df) 
+        + (5*z**5 + 16*z**3 + 3*z) / (96 * df**2) 
+        + (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / (384 * df**3) 
+        + (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) 
+        / (92160 * df**4)
+    )
+
+def _run_replication(build_func, seed, till, summary_func):
+    """
+    runs a single replication, module level so it can be sent to a worker 
+    process
+
+    Args:
+        build_func (callable): builds the model for a seed, see 
+                               `ReplicationRunner`
+        seed (int): seed of the replication
+        till (float): time epoch to run the replication until
+        summary_func (callable): returns the picklable summary of a finished 
+                                 environment
+
+    Returns:
+        dict: summary of the replication with its seed
+    """
+
+    random.seed(seed)
+    sim.random_seed(seed)
+    # the environments built get the replication seed as they are set up, 
+    # so streams drawn from while building are already seeded by it
+    Environment._default_replication_seed = seed
+    try:
+        env = build_func(seed)
+    finally:
+        Environment._default_replication_seed = None
+    # sim.Environment() reseeds `random` (1234567 when no random_seed is 
+    # given), so the replication seed is applied again once the model is built
+    random.seed(seed)
+    sim.random_seed(seed)
+    env.run(till=till)
+
+    summary = summary_func(env)
+    summary['seed'] = seed
+    return summary
+
+class ReplicationRunner(object):
+    """
+    Runs independent replications of a model across a process pool, only a 
+    small picklable summary of each replication is sent back
+    """
+
+    def __init__(self, build_func, count, base_seed, till, 
+                 summary_func=None, max_workers=None):
+        """
+        setup ReplicationRunner specific attributes, derives a seed for each 
+        replication from the base seed
+
+        Args:
+            build_func (callable): module level function taking a seed and 
+                                   returning the Environment of a built model 
+                                   (components activated), `random` is 
+                                   reseeded with the seed after the build 
+                                   and it is the replication_seed unless the 
+                                   environment sets its own
+            count (int): number of replications
+            base_seed (int): seed the replication seeds are derived from
+            till (float): time epoch to run each replication until
+            summary_func (callable): module level function taking a finished 
+                                     Environment and returning a picklable 
+                                     dict, optional, 
+                                     default=ReplicationRunner.summarize
+            max_workers (int): number of worker processes, 1 runs the 
+                               replications in this process, optional, 
+                               default=None (number of processors)
+        """
+
+        self.build_func = build_func
+        self.count = count
+        self.base_seed = base_seed
+        self.till = till
+        self.summary_func = summary_func or ReplicationRunner.summarize
+        self.max_workers = max_workers
+        self.seeds = ReplicationRunner.make_seeds(base_seed, count)
+
+    @staticmethod
+    def make_seeds(base_seed, count):
+        """
+        derives the replication seeds from a base seed, the first seeds do 
+        not change when count grows
+
+        Args:
+            base_seed (int): seed the replication seeds are derived from
+            count (int): number of replications
+        """
+
+        return [
+            int(child.generate_state(1)[0]) 
+            for child in np.random.SeedSequence(base_seed).spawn(count)
+        ]
+
+    @staticmethod
+    def summarize(env):
+        """
+        default replication summary, tracker counters and flow times and the 
+        machine and worker utilization
+
+        Args:
+            env (Environment): environment of a finished replication
+        """
+
+        return {
+            'now': env.now(),
+            'trackers': {name: obj.summary() 
+                         for name, obj in env._env_objs.items() 
+                         if isinstance(obj, EntityTracker)},
+            'utilization': env.utilization_table()
+        }
+
+    def run(self):
+        """
+        runs the replications
+
+        Returns:
+            [dict,...]: summary of each replication in replication order
+        """
+
+        if self.max_workers == 1:
+            return self._run_seeds(self.seeds)
+
+        with concurrent.futures.ProcessPoolExecutor(self.max_workers) as pool:
+            return self._run_seeds(self.seeds, pool)
+
+    def _run_seeds(self, seeds, pool=None):
+        """
+        runs the replications of the seeds, in the pool if given
+        """
+
+        if pool is None:
+            return [_run_replication(self.build_func, seed, self.till, 
+                                     self.summary_func) 
+                    for seed in seeds]
+
+        futures = [pool.submit(_run_replication, self.build_func, seed, 
+                               self.till, self.summary_func) 
+                   for seed in seeds]
+        return [future.result() for future in futures]
+
+    def run_sequential(self, kpis, rel_half_width=0.05, confidence=0.95, 
+                       batch_size=None, max_replications=100, 
+                       min_replications=3):
+        """
+        runs batches of replications until the confidence interval of every 
+        kpi is within the relative half-width or the budget runs out, the 
+        first batch is count replications (at least min_replications)
+
+        Args:
+            kpis ({str: callable|tuple}): kpi name to a function of a 
+                                          replication summary or a key path 
+                                          into it, e.g. ('trackers', 
+                                          'track.part_c', 'throughput')
+            rel_half_width (float): target half-width of the confidence 
+                                    interval relative to the mean, optional, 
+                                    default=0.05
+            confidence (float): confidence level of the intervals, optional, 
+                                default=0.95
+            batch_size (int): replications per further batch, optional, 
+                              default=None (max_workers, or the number of 
+                              processors)
+            max_replications (int): budget of replications, optional, 
+                                    default=100
+            min_replications (int): replications before the intervals are 
+                                    checked, optional, default=3
+
+        Returns:
+            dict: summaries of the replications, the achieved interval of 
+                  each kpi and whether all kpis met the target
+        """
+
+        if batch_size is None:
+            batch_size = self.max_workers or os.cpu_count() or 1
+        count = min(max(self.count, min_replications), max_replications)
+
+        pool = (None if self.max_workers == 1 
+                else concurrent.futures.ProcessPoolExecutor(self.max_workers))
+        try:
+            summaries = []
+            while True:
+                seeds = ReplicationRunner.make_seeds(self.base_seed, count)
+                summaries.extend(self._run_seeds(seeds[len(summaries):], pool))
+
+                intervals = {
+                    name: ReplicationRunner.interval(
+                        [ReplicationRunner._kpi_value(kpi, summary) 
+                         for summary in summaries], 
+                        confidence, rel_half_width
+                    )
+                    for name, kpi in kpis.items()
+                }
+                converged = all(interval['met'] 
+                                for interval in intervals.values())
+                if converged or count >= max_replications:
+                    break
+                count = min(count + batch_size, max_replications)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return {
+            'summaries': summaries,
+            'intervals': intervals,
+            'converged': converged
+        }
+
+    @staticmethod
+    def _kpi_value(kpi, summary):
+        """
+        returns the value of a kpi in a replication summary
+        """
+
+        if callable(kpi):
+            return kpi(summary)
+        for key in kpi:
+            summary = summary[key]
+        return summary
+
+    @staticmethod
+    def interval(values, confidence=0.95, rel_half_width=None):
+        """
+        returns the Student t confidence interval of the mean of values
+
+        Args:
+            values ([float,...]): one observation per replication
+            confidence (float): confidence level, optional, default=0.95
+            rel_half_width (float): target half-width relative to the mean, 
+                                    optional, default=None
+
+        Returns:
+            dict: n, mean, half_width, rel_half_width and whether the target 
+                  was met
+        """
+
+        stats = StreamingStats(quantiles=())
+        for value in values:
+            stats.add(value)
+
+        if stats.count < 2:
+            half_width = float('inf')
+        else:
+            t = _t_quantile((1 + confidence) / 2, stats.count - 1)
+            half_width = t * (stats.variance() / stats.count) ** 0.5
+
+        if stats.mean != 0:
+            relative = half_width / abs(stats.mean)
+        else:
+            relative = 0. if half_width == 0 else float('inf')
+
+        return {
+            'n': stats.count,
+            'mean': stats.mean,
+            'half_width': half_width,
+            'rel_half_width': relative,
+            'met': rel_half_width is not None and relative <= rel_half_width
+        }
+
+class ParameterSweep(object):
+    """
+    Runs replications of a model over points of named model parameters 
+    (a grid or a Latin hypercube), every replication result is cached on 
+    disk as soon as it finishes so only new combinations are simulated
+    """
+
+    def __init__(self, build_func, till, replications, base_seed, cache_dir, 
+                 summary_func=None, max_workers=None, model_source=None):
+        """
+        setup ParameterSweep specific attributes
+
+        Args:
+            build_func (callable): module level function taking a seed and 
+                                   the parameters as keyword arguments and 
+                                   returning the Environment of a built model
+            till (float): time epoch to run each replication until
+            replications (int): number of replications per point
+            base_seed (int): seed the replication seeds are derived from (see 
+                             `ReplicationRunner.make_seeds`), the same for 
+                             every point
+            cache_dir (str): directory the replication results are cached in
+            summary_func (callable): module level function taking a finished 
+                                     Environment and returning a picklable 
+                                     dict, optional, 
+                                     default=ReplicationRunner.summarize
+            max_workers (int): number of worker processes, 1 runs the 
+                               replications in this process, optional, 
+                               default=None (number of processors)
+            model_source (str): model source or version hashed into the 
+                                cache keys, optional, default=None (sources 
+                                of the model modules, see `model_modules`)
+        """
+
+        self.build_func = build_func
+        self.till = till
+        self.replications = replications
+        self.base_seed = base_seed
+        self.cache_dir = cache_dir
+        self.summary_func = summary_func or ReplicationRunner.summarize
+        self.summary_name = (self.summary_func.__module__ + '.' 
+                             + self.summary_func.__qualname__)
+        self.max_workers = max_workers
+        if model_source is None:
+            model_source = ''.join(
+                self._source(module, func) for module, func in 
+                self.model_modules(build_func, self.summary_func)
+            )
+        self.source_hash = hashlib.sha256(model_source.encode()).hexdigest()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def model_modules(*funcs):
+        """
+        returns the modules the results of a model depend on, the modules 
+        defining the functions and salabim_plus, plus the modules they 
+        import (directly or through each other) that are not installed in 
+        the python environment
+
+        Args:
+            *funcs (callable): model functions, e.g. build_func and 
+                               summary_func
+
+        Returns:
+            [(module, callable),...]: modules sorted by name, with the 
+                                      function they were found from (None 
+                                      for imported modules)
+        """
+
+        paths = sysconfig.get_paths()
+        installed = tuple({paths['stdlib'], paths['platstdlib'], 
+                           paths['purelib'], paths['platlib']})
+
+        todo = [(sys.modules[__name__], None)]
+        todo.extend((inspect.getmodule(getattr(func, 'func', func)), func) 
+                    for func in funcs)
+        found = {}
+        while todo:
+            module, func = todo.pop()
+            if module is None or module.__name__ in found:
+                continue
+            found[module.__name__] = (module, func)
+            for value in vars(module).values():
+                if inspect.ismodule(value):
+                    dependency = value
+                elif inspect.isfunction(value) or inspect.isclass(value):
+                    dependency = sys.modules.get(value.__module__)
+                else:
+                    continue
+                filename = getattr(dependency, '__file__', None)
+                if filename and not filename.startswith(installed):
+                    todo.append((dependency, None))
+
+        return [found[name] for name in sorted(found)]
+
+    @staticmethod
+    def _source(module, func=None):
+        """
+        returns the source of a model module, the source of the function 
+        found from it if the module has no source file (e.g. a notebook)
+        """
+
+        try:
+            return inspect.getsource(module)
+        except (OSError, TypeError):
+            if func is None:
+                return ''
+            return inspect.getsource(getattr(func, 'func', func))
+
+    @staticmethod
+    def grid(**levels):
+        """
+        returns the full factorial points of the parameter levels
+
+        Args:
+            **levels ([any,...]): levels of each named parameter
+
+        Returns:
+            [dict,...]: parameter points
+        """
+
+        names = list(levels)
+        return [dict(zip(names, values)) 
+                for values in itertools.product(*levels.values())]
+
+    @staticmethod
+    def latin_hypercube(count, seed=None, **ranges):
+        """
+        returns a Latin hypercube sample of the parameter ranges, every 
+        parameter range is split into count strata each sampled once, 
+        ranges given as ints give int parameters
+
+        Args:
+            count (int): number of points
+            seed (int): seed of the sample, optional, default=None
+            **ranges ((float, float)): (low, high) range of each named 
+                                       parameter
+
+        Returns:
+            [dict,...]: parameter points
+        """
+
+        rng = np.random.default_rng(seed)
+        points = [{} for _ in range(count)]
+        for name, (low, high) in ranges.items():
+            unit = (rng.permutation(count) + rng.random(count)) / count
+            if isinstance(low, int) and isinstance(high, int):
+                values = np.floor(low + unit * (high - low + 1)).astype(int)
+            else:
+                values = low + unit * (high - low)
+            for point, value in zip(points, values.tolist()):
+                point[name] = value
+        return points
+
+    def cache_key(self, params, seed):
+        """
+        returns the cache key of a replication, a hash of the parameters, 
+        the seed, the run length, the summary function and the model source
+
+        Args:
+            params (dict): parameter point
+            seed (int): replication seed
+        """
+
+        key = json.dumps(
+            [params, seed, self.till, self.summary_name, self.source_hash], 
+            sort_keys=True, default=repr
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _cache_path(self, key):
+        """
+        returns the filepath a replication result is cached at
+        """
+
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def _write_cache(self, key, summary):
+        """
+        writes a replication result to the cache, through a temporary file 
+        that replaces the cache file at once so an interrupted sweep never 
+        leaves a partial result behind
+        """
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(summary, f)
+            os.replace(tmp_path, self._cache_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def run(self, points):
+        """
+        runs the replications of the points that are not cached yet
+
+        Args:
+            points ([dict,...]): parameter points, e.g. from `grid` or 
+                                 `latin_hypercube`
+
+        Returns:
+            [dict,...]: per point, its params and the summary of each of its 
+                        replications
+        """
+
+        seeds = ReplicationRunner.make_seeds(self.base_seed, self.replications)
+        results = {}
+        jobs = []
+        for params in points:
+            for seed in seeds:
+                key = self.cache_key(params, seed)
+                if key in results:
+                    continue
+                path = self._cache_path(key)
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        results[key] = pickle.load(f)
+                else:
+                    results[key] = None
+                    jobs.append((key, params, seed))
+
+        args = {key: (functools.partial(self.build_func, **params), seed, 
+                      self.till, self.summary_func) 
+                for key, params, seed in jobs}
+        if self.max_workers == 1 or not args:
+            for key, arg in args.items():
+                results[key] = _run_replication(*arg)
+                self._write_cache(key, results[key])
+        else:
+            with concurrent.futures.ProcessPoolExecutor(self.max_workers) as pool:
+                futures = {pool.submit(_run_replication, *arg): key 
+                           for key, arg in args.items()}
+                # cached as each finishes, an interrupted sweep keeps them
+                for future in concurrent.futures.as_completed(futures):
+                    key = futures[future]
+                    results[key] = future.result()
+                    self._write_cache(key, results[key])
+
+        return [
+            {'params': params, 
+             'replications': [results[self.cache_key(params, seed)] 
+                              for seed in seeds]}
+            for params in points
+        ]
@@ -20,6 +20,7 @@ setup(
     license=license,
     packages=find_packages(exclude=('tests', 'docs')),
     install_requires=[
+        'numpy>=1.17.0',
         'pandas>=1.0.1',
         'plotly>=4.4.1',
         'salabim>=20.0.1'
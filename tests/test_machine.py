@@ -0,0 +1,85 @@
+import salabim as sim
+import salabim_plus as sim_plus
+
+
+def build(setup_time, run_time, teardown_time, interval=30):
+    """
+    builds a single worker-free machine fed an entity every interval
+    """
+
+    env = sim_plus.Environment(trace=False, random_seed=1)
+    sim_plus.Machine(var_name='m', env=env)
+    sim_plus.Storage(var_name='out', env=env)
+
+    def routing(env, first_step='op1'):
+        tasks = {
+            'op1': {
+                'location': env['m'],
+                'setup_time': setup_time,
+                'run_time': run_time,
+                'teardown_time': teardown_time,
+                'transit_time': 1,
+                'route_to': env['out_storage']
+            }
+        }
+        return sim_plus.make_steps(first_step=first_step, tasks=tasks)
+
+    gen = sim_plus.EntityGenerator(var_name='p', steps_func=routing, env=env,
+                                   arrival_type='periodic', interval=interval)
+    gen.activate(process='arrive')
+    return env
+
+
+class Resetter(sim.Component):
+    """
+    resets the warm-up statistics at a fixed time epoch
+    """
+
+    def setup(self, detector, reset_at):
+        self.detector = detector
+        self.reset_at = reset_at
+
+    def process(self):
+        yield self.hold(self.reset_at)
+        self.detector.reset_stats()
+
+
+def test_phase_durations():
+    env = build(setup_time=5, run_time=10, teardown_time=3)
+    env.run(till=500)
+    durations = env._env_objs['m'].state_durations()
+
+    assert durations['changeover_setup'] == 85
+    assert durations['running'] == 170
+    assert durations['changeover_teardown'] == 51
+    assert sum(durations.values()) == 500
+
+
+def test_single_hold_without_changeover():
+    env = build(setup_time=0, run_time=10, teardown_time=0)
+    env.run(till=500)
+    durations = env._env_objs['m'].state_durations()
+
+    assert durations['running'] == 170
+    assert durations.get('changeover_setup', 0) == 0
+    assert durations.get('changeover_teardown', 0) == 0
+    assert sum(durations.values()) == 500
+
+
+def test_reset_inside_hold():
+    # entity 2 arrives at 30, sets up from 30 to 35 and runs from 35 to 45
+    for at, running, setup in ((32, 160, 78), (40, 155, 75)):
+        env = build(setup_time=5, run_time=10, teardown_time=3)
+        detector = sim_plus.WarmupDetector(env, interval=60,
+                                           min_batches=1000)
+        Resetter(detector=detector, reset_at=at)
+        env.run(till=500)
+
+        durations = env._env_objs['m'].state_durations()
+        assert min(durations.values()) >= 0
+        assert sum(durations.values()) == 500 - at
+        assert durations['running'] == running
+        assert durations['changeover_setup'] == setup
+
+        tracker = env._env_objs['track.p']
+        assert tracker.complete_num == len(tracker.complete)
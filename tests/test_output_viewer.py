@@ -0,0 +1,67 @@
+import os
+import shutil
+
+import pandas as pd
+
+from salabim_plus import output_viewer
+
+
+TRACE = os.path.join(os.path.dirname(__file__), '..', 'examples', 'data',
+                     'output_20200312_235750.txt')
+
+
+def copy_trace(tmp_path):
+    """
+    copies the example trace so its caches are written to a temp directory
+    """
+
+    path = str(tmp_path / 'trace.txt')
+    shutil.copy(TRACE, path)
+    return path
+
+
+def test_chunked_matches_full():
+    full = output_viewer.get_state_df(TRACE)
+    for chunksize in (997, 100000):
+        chunked = output_viewer.get_state_df_chunked(TRACE, chunksize)
+        pd.testing.assert_frame_equal(full, chunked)
+
+
+def test_no_cache_by_default(tmp_path):
+    path = copy_trace(tmp_path)
+    output_viewer.get_state_df(path)
+    output_viewer.get_state_df_chunked(path)
+
+    assert os.listdir(str(tmp_path)) == ['trace.txt']
+
+
+def test_cache_round_trip(tmp_path):
+    path = copy_trace(tmp_path)
+    parsed = output_viewer.get_state_df(path, cache=True)
+    cached = output_viewer.read_state_cache(path)
+
+    assert cached is not None
+    pd.testing.assert_frame_equal(parsed, cached)
+    pd.testing.assert_frame_equal(
+        parsed, output_viewer.get_state_df_chunked(path, cache=True)
+    )
+
+
+def test_corrupt_cache_is_a_miss(tmp_path):
+    path = copy_trace(tmp_path)
+    parsed = output_viewer.get_state_df(path, cache=True)
+    cache_path = output_viewer._state_cache_path(path)
+    with open(cache_path, 'rb') as f:
+        data = f.read()
+    with open(cache_path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    assert output_viewer.read_state_cache(path) is None
+    pd.testing.assert_frame_equal(
+        parsed, output_viewer.get_state_df(path, cache=True)
+    )
+    # the cache is written again in full, with no temp file left behind
+    assert os.path.getsize(cache_path) == len(data)
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        ['trace.txt', os.path.basename(cache_path)]
+    )
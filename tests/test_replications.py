@@ -0,0 +1,128 @@
+import salabim_plus as sim_plus
+
+
+def routing(env):
+    """
+    routing template with a random run time and a yield decision that sends
+    failed entities to rework
+    """
+
+    sampling = env['gener.p'].sampling
+    tasks = {
+        'op1': {
+            'location': env['m'],
+            'setup_time': 0,
+            'run_time': sampling.gauss(10, 2, name='op1'),
+            'teardown_time': 0,
+            'transit_time': 1,
+            'yield': 0.7,
+            'route_to_pass': env['out_storage'],
+            'route_to_fail': 'rework'
+        },
+        'rework': {
+            'location': env['m'],
+            'setup_time': 0,
+            'run_time': sampling.uniform(2, 6, name='rework'),
+            'teardown_time': 0,
+            'transit_time': 1,
+            'route_to': 'op1'
+        }
+    }
+    return sim_plus.RoutingTemplate('op1', tasks)
+
+
+def build(seed, lazy_routing=False):
+    env = sim_plus.Environment(trace=False, random_seed=1)
+    sim_plus.Machine(var_name='m', env=env)
+    sim_plus.Storage(var_name='out', env=env)
+    gen = sim_plus.EntityGenerator(var_name='p', steps_func=None,
+                                   template_func=routing,
+                                   lazy_routing=lazy_routing, env=env,
+                                   arrival_type='periodic', interval=15)
+    gen.activate(process='arrive')
+    return env
+
+
+def build_drawing(seed):
+    env = build(seed)
+    # a stream drawn from while the model is built
+    env.built_draw = env.random_stream('build').random()
+    return env
+
+
+def summarize_drawing(env):
+    return {'replication_seed': env.replication_seed,
+            'built_draw': env.built_draw}
+
+
+def test_replications_reproducible():
+    first = sim_plus.ReplicationRunner(build, 4, 42, 2000,
+                                       max_workers=1).run()
+    second = sim_plus.ReplicationRunner(build, 4, 42, 2000,
+                                        max_workers=1).run()
+
+    assert first == second
+    assert len({repr(summary['trackers']) for summary in first}) > 1
+
+
+def test_streams_seeded_before_build():
+    summaries = sim_plus.ReplicationRunner(
+        build_drawing, 4, 42, 10, summary_func=summarize_drawing,
+        max_workers=1
+    ).run()
+
+    for summary in summaries:
+        assert summary['replication_seed'] == summary['seed']
+    assert len({summary['built_draw'] for summary in summaries}) == 4
+
+
+def test_decisions_do_not_depend_on_order():
+    env = build(0)
+    gen = env._env_objs['gener.p']
+    counts = list(range(50)) + [10**6, 10**6 + 1]
+
+    def draws(count):
+        rng = gen.entity_rng(count)
+        return [rng('op1').random() for _ in range(6)]
+
+    forward = {count: draws(count) for count in counts}
+    backward = {count: draws(count) for count in reversed(counts)}
+
+    assert forward == backward
+    assert len({tuple(values) for values in forward.values()}) == len(counts)
+
+
+def test_eager_and_lazy_routing_decide_alike():
+    results = []
+    for lazy_routing in (False, True):
+        env = build(0, lazy_routing=lazy_routing)
+        env.replication_seed = 7
+        env.run(till=2000)
+        tracker = env._env_objs['track.p']
+        results.append((tracker.complete_num,
+                        env._env_objs['m'].state_durations()))
+
+    assert results[0] == results[1]
+
+
+def test_lazy_routing_draws_visited_tasks_only():
+    calls = []
+
+    def sampler(name):
+        def draw():
+            calls.append(name)
+            return 1.
+        return draw
+
+    tasks = {
+        'op1': {'run_time': sampler('op1'), 'yield': 1.,
+                'route_to_pass': None, 'route_to_fail': 'rework'},
+        'rework': {'run_time': sampler('rework'), 'route_to': 'op1'}
+    }
+    template = sim_plus.RoutingTemplate('op1', tasks)
+    steps = template.iter_steps()
+
+    next(steps)
+    assert calls == ['op1']
+    assert list(steps) == []
+    assert calls == ['op1']